@@ -1,8 +1,13 @@
 import argparse
-import configparser
+import atexit
 import logging
+import multiprocessing
+import os
+import queue
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
+from logging.handlers import QueueListener
 
 import requests.exceptions
 from web3 import Web3
@@ -13,6 +18,9 @@ from policies.policy_haircut import HaircutPolicy
 from policies.policy_poison import PoisonPolicy
 from policies.policy_reversed_seniority import ReversedSeniorityPolicy
 from policies.policy_seniority import SeniorityPolicy
+from utilities.config import load_config
+from utilities.rpc import BatchHTTPProvider, BatchIPCProvider
+from utilities.utils import UnformattedQueueHandler
 
 # configure logging
 logger = logging.getLogger(__name__)
@@ -20,21 +28,24 @@ logger.setLevel(logging.INFO)
 formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+# only enqueue log records, they are formatted and written by a background thread
+log_queue = queue.Queue(-1)
+logger.addHandler(UnformattedQueueHandler(log_queue))
+log_listener = QueueListener(log_queue, console_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
 
 # read config.ini
-config = configparser.ConfigParser()
-config.read("config.ini")
-parameters = config["PARAMETERS"]
+config = load_config()
 
-# use default Erigon URL for local provider
-local_provider = Web3.HTTPProvider("http://localhost:8545")
+# policies by the name used for --policy
+POLICIES = {"fifo": FIFOPolicy, "seniority": SeniorityPolicy, "haircut": HaircutPolicy, "reversed_seniority": ReversedSeniorityPolicy, "poison": PoisonPolicy}
 
 # read data folder from config file
-data_folder_root = parameters["DataFolder"]
+data_folder_root = config.data_folder
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Dataset:
     """
     Represents a dataset, including the experiment range, starting accounts and output folder
@@ -47,26 +58,62 @@ class Dataset:
     permanent_taint: bool = False  # whether to taint the starting accounts permanently (if false, only their current balance is tainted)
 
 
-def policy_test(policy, dataset: Dataset, load_checkpoint):
+def create_web3() -> Web3:
+    """
+    Creates a Web3 instance connected to the local node
+
+    :return: Web3 instance
+    """
+    # the batch providers allow the per-block requests to be sent in a single round trip
+    # prefer the IPC endpoint of the local node, if available, else use the default Erigon URL
+    if config.ipc_path and os.path.exists(config.ipc_path):
+        local_provider = BatchIPCProvider(config.ipc_path)
+    else:
+        local_provider = BatchHTTPProvider("http://localhost:8545")
+    web3_instance = Web3(local_provider)
+
+    return web3_instance
+
+
+def pin_to_core(policy_name: str):
+    """
+    Pins the current process to the CPU core configured for the given policy in the CoreMap parameter, if any
+
+    :param policy_name: policy name as used for --policy
+    """
+    core = config.core_map.get(policy_name)
+    if core is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {core})
+        logger.info("Pinned policy %s to CPU core %s.", policy_name, core)
+
+
+def policy_test(policy, dataset: Dataset, load_checkpoint, clear_confirmed=False, sanity_check=False):
     """
     Runs the provided policy
 
     :param policy: the blacklisting policy to be used
     :param dataset: the dataset containing the parameters for execution
     :param load_checkpoint: set true to load an existing checkpoint, false to ignore checkpoints
+    :param clear_confirmed: whether clearing the metrics file was already confirmed
+    :param sanity_check: whether to compare the blacklisted values to the actual balances at the end
     """
     blacklist_policy: BlacklistPolicy = policy(w3, data_folder=dataset.data_folder)
+    pin_to_core(blacklist_policy.get_policy_name().lower().replace(" ", "_"))
 
     print(f"Starting Policy test with policy '{blacklist_policy.get_policy_name()}' and dataset '{dataset.name}'.")
 
-    for account in dataset.start_accounts:
-        if dataset.permanent_taint:
+    # validate and normalize the starting accounts once, the policies compare addresses in checksum format
+    start_accounts = [Web3.toChecksumAddress(account) for account in dataset.start_accounts]
+
+    if dataset.permanent_taint:
+        for account in start_accounts:
             blacklist_policy.permanently_taint_account(account)
-        else:
-            blacklist_policy.add_account_to_blacklist(address=account, block=dataset.start_block)
+    else:
+        blacklist_policy.add_accounts_to_blacklist(start_accounts, dataset.start_block)
 
     try:
-        blacklist_policy.propagate_blacklist(dataset.start_block, dataset.block_number, load_checkpoint=load_checkpoint)
+        blacklist_policy.propagate_blacklist(dataset.start_block, dataset.block_number, load_checkpoint=load_checkpoint, clear_confirmed=clear_confirmed,
+                                              sanity_check=sanity_check)
         print("Metrics:")
         print(blacklist_policy.get_blacklist_metrics())
 
@@ -76,7 +123,7 @@ def policy_test(policy, dataset: Dataset, load_checkpoint):
 
     except ValueError as e:
         if e.args and "code" in e.args[0] and e.args[0]["code"] == -32000:
-            logger.error(f"ValueError: the given start block {dataset.start_block:,} is likely pruned.")
+            logger.error("ValueError: the given start block %s is likely pruned.", format(dataset.start_block, ","))
             exit(-32)
         else:
             raise e
@@ -89,6 +136,24 @@ def policy_test(policy, dataset: Dataset, load_checkpoint):
         blacklist_policy.export_tainted_transactions(10)
 
 
+def policy_worker(policy, dataset: Dataset, load_checkpoint, sanity_check=False):
+    """
+    Runs the provided policy in a worker process.
+    Every worker needs its own connection to the node, since the provider cannot be shared between processes.
+    Workers are spawned rather than forked, since the parent's background threads (e.g. for logging) cannot be inherited.
+    Worker processes cannot read from stdin, so clearing the metrics file has to be confirmed beforehand.
+
+    :param policy: the blacklisting policy to be used
+    :param dataset: the dataset containing the parameters for execution
+    :param load_checkpoint: set true to load an existing checkpoint, false to ignore checkpoints
+    :param sanity_check: whether to compare the blacklisted values to the actual balances at the end
+    """
+    global w3
+    w3 = create_web3()
+
+    policy_test(policy, dataset, load_checkpoint, clear_confirmed=True, sanity_check=sanity_check)
+
+
 if __name__ == '__main__':
     logger.info("************ Starting **************")
 
@@ -119,8 +184,9 @@ if __name__ == '__main__':
     used_dataset = None
 
     parser = argparse.ArgumentParser(description="Test a policy with a predefined dataset")
-    parser.add_argument("--policy", type=str, required=True, help="Picked policy out of 'Poison', 'Haircut', 'FIFO', 'Seniority', or 'Reversed_Seniority'")
+    parser.add_argument("--policy", type=str, required=True, help="Picked policy out of 'Poison', 'Haircut', 'FIFO', 'Seniority', or 'Reversed_Seniority', or 'All' to run all of them in parallel")
     parser.add_argument("--dataset", type=int, required=True, help=f"Number of the chosen dataset (1 - {len(datasets)})")
+    parser.add_argument("--sanity", action="store_true", help="Compare all blacklisted values to the actual balances after the propagation (one request per value)")
 
     args = parser.parse_args()
 
@@ -130,19 +196,19 @@ if __name__ == '__main__':
     if 1 <= picked_dataset <= len(datasets):
         used_dataset = datasets[picked_dataset - 1]
     else:
-        logger.error(f"Dataset {picked_dataset} does not exist.")
+        logger.error("Dataset %s does not exist.", picked_dataset)
         exit(-2)
 
     # ********* SETUP *************
 
     # setup web3
-    w3 = Web3(local_provider)
+    w3 = create_web3()
 
     # get the latest synchronized block and log it
     # quit the program if no node was found
     try:
         latest_block = w3.eth.get_block_number()
-        logger.info(f"Latest block: {latest_block}.")
+        logger.info("Latest block: %s.", latest_block)
     except requests.exceptions.ConnectionError:
         logger.error("No node found at the given address.")
         exit(-1)
@@ -152,16 +218,26 @@ if __name__ == '__main__':
     # load checkpoints for all policies
     load_checkpoint_all = True
 
-    if picked_policy == "fifo":
-        policy_test(FIFOPolicy, used_dataset, load_checkpoint=load_checkpoint_all)
-    elif picked_policy == "seniority":
-        policy_test(SeniorityPolicy, used_dataset, load_checkpoint=load_checkpoint_all)
-    elif picked_policy == "haircut":
-        policy_test(HaircutPolicy, used_dataset, load_checkpoint=load_checkpoint_all)
-    elif picked_policy == "reversed_seniority":
-        policy_test(ReversedSeniorityPolicy, used_dataset, load_checkpoint=load_checkpoint_all)
-    elif picked_policy == "poison":
-        policy_test(PoisonPolicy, used_dataset, load_checkpoint=load_checkpoint_all)
+    if picked_policy in POLICIES:
+        policy_test(POLICIES[picked_policy], used_dataset, load_checkpoint=load_checkpoint_all, sanity_check=args.sanity)
+    elif picked_policy == "all":
+        # the policies share no state, so each one runs in its own process
+        all_policies = list(POLICIES.values())
+
+        print("WARNING: the metrics files of all policies without a usable checkpoint will be cleared. Enter 'y' to continue.")
+        response = input(">> ")
+        if response.lower() != "y":
+            print("Exiting.")
+            exit(0)
+
+        with ProcessPoolExecutor(max_workers=len(all_policies), mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {executor.submit(policy_worker, policy, used_dataset, load_checkpoint_all, args.sanity): policy for policy in all_policies}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    logger.info("Policy test with %s finished.", futures[future].__name__)
+                except (Exception, SystemExit) as e:
+                    logger.error("Policy test with %s failed: %r", futures[future].__name__, e)
     else:
-        logger.error(f"Invalid policy name {picked_policy}.")
+        logger.error("Invalid policy name %s.", picked_policy)
         exit(-2)
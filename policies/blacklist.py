@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
+from collections import deque
 
-from typing import Set
+from typing import Optional, Set
 
 
 class Blacklist(ABC):
@@ -73,6 +74,18 @@ class Blacklist(ABC):
         """
         pass
 
+    @abstractmethod
+    def try_get_blacklist_value(self, account: str, currency: str) -> Optional[int]:
+        """
+        Retrieves the amount of blacklisted currency for the given account and currency, if they are on the blacklist.
+        Replaces is_blacklisted followed by get_account_blacklist_value with a single lookup.
+
+        :param account: ethereum address
+        :param currency: ETH or token address
+        :return: the blacklisted value, None if not blacklisted
+        """
+        pass
+
     @abstractmethod
     def add_currency_to_all(self, account: str, currency: str):
         pass
@@ -105,6 +118,9 @@ class Blacklist(ABC):
         raise NotImplementedError("Only available for FIFO")
         pass
 
+    def try_get_tracked_value(self, account, currency) -> Optional[int]:
+        raise NotImplementedError("Only available for FIFO")
+
 
 class SetBlacklist(Blacklist):
     """
@@ -134,6 +150,12 @@ class SetBlacklist(Blacklist):
     def get_blacklist(self):
         return list(self._blacklist)
 
+    def get_accounts(self) -> Set:
+        """
+        :return: the set of blacklisted accounts itself (not a copy), so that membership can be checked without a method call
+        """
+        return self._blacklist
+
     def remove_from_blacklist(self, address: str, amount: int = None, currency: str = None):
         self._blacklist.remove(address)
         return -1
@@ -144,6 +166,9 @@ class SetBlacklist(Blacklist):
     def get_account_blacklist_value(self, account: str, currency: int = None) -> int:
         return 0
 
+    def try_get_blacklist_value(self, account: str, currency: str = None) -> Optional[int]:
+        return 0 if account in self._blacklist else None
+
     def add_currency_to_all(self, account: str, currency: str):
         pass
 
@@ -179,34 +204,42 @@ class DictBlacklist(Blacklist):
         return {account: all_accounts[account] for account in result_list}
 
     def set_blacklist(self, blacklist: dict):
+        # checkpoints created before the "all" flags were sets contain lists
+        for currencies in blacklist.values():
+            if isinstance(currencies.get("all"), list):
+                currencies["all"] = set(currencies["all"])
+
         self._blacklist = blacklist
 
     def is_blacklisted(self, address: str, currency=None):
         if currency is None:
             return address in self._blacklist
         else:
-            return address in self._blacklist and currency in self._blacklist[address]
+            # the currencies of the address are looked up once and kept in a local variable, here and below
+            currencies = self._blacklist.get(address)
+            return currencies is not None and currency in currencies
 
     def add_to_blacklist(self, address, currency, amount, total_amount=None):
+        currencies = self._blacklist.get(address)
         # add address if not in blacklist
-        if address not in self._blacklist:
-            self._blacklist[address] = {}
+        if currencies is None:
+            currencies = self._blacklist[address] = {}
 
         # add currency to address if not in blacklist
-        if currency not in self._blacklist[address]:
-            self._blacklist[address][currency] = 0
-
-        self._blacklist[address][currency] += amount
+        currencies[currency] = currencies.get(currency, 0) + amount
 
     def remove_from_blacklist(self, address, amount, currency):
         amount = abs(amount)
 
-        self._blacklist[address][currency] -= amount
-        if self._blacklist[address][currency] == 0:
-            del self._blacklist[address][currency]
+        currencies = self._blacklist[address]
+        remaining_value = currencies[currency] - amount
+        if remaining_value == 0:
+            del currencies[currency]
 
-            if not self._blacklist[address]:
+            if not currencies:
                 del self._blacklist[address]
+        else:
+            currencies[currency] = remaining_value
 
         return amount
 
@@ -214,18 +247,25 @@ class DictBlacklist(Blacklist):
         # add address to blacklist
         if account not in self._blacklist:
             self._blacklist[account] = {}
-        # set all flag or clear it
-        self._blacklist[account]["all"] = []
+        # set all flag or clear it, a set of the currencies whose entire balance has been tainted
+        self._blacklist[account]["all"] = set()
 
     def get_account_blacklist_value(self, account: str, currency: str) -> int:
-        if account not in self._blacklist or currency not in self._blacklist[account]:
+        currencies = self._blacklist.get(account)
+        if currencies is None:
             return 0
 
-        else:
-            return self._blacklist[account][currency]
+        return currencies.get(currency, 0)
+
+    def try_get_blacklist_value(self, account: str, currency: str) -> Optional[int]:
+        currencies = self._blacklist.get(account)
+        if currencies is None:
+            return None
+
+        return currencies.get(currency)
 
     def add_currency_to_all(self, account: str, currency: str):
-        self._blacklist[account]["all"].append(currency)
+        self._blacklist[account]["all"].add(currency)
 
     def get_metrics(self):
         result = {}
@@ -259,7 +299,7 @@ class DictBlacklist(Blacklist):
 
 class FIFOBlacklist(Blacklist):
     """
-    Blacklist specifically for the FIFO policy, using a dict of accounts mapped to a list of transaction values and taint amounts
+    Blacklist specifically for the FIFO policy, using a dict of accounts mapped to a queue (deque) of transaction values and taint amounts
     """
 
     def __init__(self):
@@ -276,6 +316,20 @@ class FIFOBlacklist(Blacklist):
 
         return tracked_value
 
+    def try_get_tracked_value(self, account, currency) -> Optional[int]:
+        """
+        Retrieves the tracked value of the given account and currency, if they are on the blacklist
+
+        :param account: ethereum address
+        :param currency: ETH or token address
+        :return: the tracked value, None if not blacklisted
+        """
+        transactions = self._blacklist.get(account, {}).get(currency)
+        if transactions is None:
+            return None
+
+        return sum(tx[1] for tx in transactions)
+
     def get_top_accounts(self, number, currencies) -> dict:
         all_accounts: dict = {}
 
@@ -297,29 +351,32 @@ class FIFOBlacklist(Blacklist):
             total_amount = amount
 
         # add address if not in blacklist
-        if address not in self._blacklist:
-            self._blacklist[address] = {}
+        currencies = self._blacklist.get(address)
+        if currencies is None:
+            currencies = self._blacklist[address] = {}
 
         # add currency if not in blacklist[address]
-        if currency not in self._blacklist[address]:
-            self._blacklist[address][currency] = []
+        transactions = currencies.get(currency)
+        if transactions is None:
+            transactions = currencies[currency] = deque()
 
-        if amount == 0 and self._blacklist[address][currency] and self._blacklist[address][currency][-1][0] == 0:
-            self._blacklist[address][currency][-1][1] += total_amount
+        if amount == 0 and transactions and transactions[-1][0] == 0:
+            transactions[-1][1] += total_amount
         else:
-            self._blacklist[address][currency].append([amount, total_amount])
+            transactions.append([amount, total_amount])
 
         # remove address and currency if value is 0
-        if self.get_account_blacklist_value(address, currency) == 0:
-            self._blacklist[address].pop(currency)
-        if not self._blacklist[address]:
-            self._blacklist.pop(address)
+        if amount == 0 and sum(tx[0] for tx in transactions) == 0:
+            currencies.pop(currency)
+            if not currencies:
+                self._blacklist.pop(address)
 
     def is_blacklisted(self, address: str, currency=None):
         if currency is None:
             return address in self._blacklist
         else:
-            return address in self._blacklist and currency in self._blacklist[address]
+            currencies = self._blacklist.get(address)
+            return currencies is not None and currency in currencies
 
     def get_blacklisted_amount(self):
         amounts = {}
@@ -345,35 +402,37 @@ class FIFOBlacklist(Blacklist):
         """
         blacklisted_amount_removed = 0
 
-        while self._blacklist[address][currency]:
-            blacklisted_tx = self._blacklist[address][currency][0]
+        currencies = self._blacklist[address]
+        transactions = currencies[currency]
+        while transactions:
+            blacklisted_tx = transactions[0]
             amount_reduced = min(amount, blacklisted_tx[1])
             remaining_taint_in_tx = min(blacklisted_tx[0], blacklisted_tx[1] - amount_reduced)
             removed_taint = blacklisted_tx[0] - remaining_taint_in_tx
             blacklisted_amount_removed += removed_taint
 
-            self._blacklist[address][currency][0][0] -= removed_taint
-            self._blacklist[address][currency][0][1] -= amount_reduced
+            blacklisted_tx[0] -= removed_taint
+            blacklisted_tx[1] -= amount_reduced
 
             # remove the transaction if all its value has been used
-            if self._blacklist[address][currency][0][1] == 0:
-                self._blacklist[address][currency].pop(0)
+            if blacklisted_tx[1] == 0:
+                transactions.popleft()
 
             amount -= amount_reduced
             if amount == 0:
                 break
 
-        if self.get_account_blacklist_value(address, currency) == 0:
-            self._blacklist[address].pop(currency)
-        if not self._blacklist[address]:
+        if sum(tx[0] for tx in transactions) == 0:
+            currencies.pop(currency)
+        if not currencies:
             self._blacklist.pop(address)
         return blacklisted_amount_removed
 
     def add_account_to_blacklist(self, account: str, block: int):
         if account not in self._blacklist:
             self._blacklist[account] = {}
-        # set all flag or clear it
-        self._blacklist[account]["all"] = []
+        # set all flag or clear it, a set of the currencies whose entire balance has been tainted
+        self._blacklist[account]["all"] = set()
 
     def get_account_blacklist_value(self, account: str, currency: str):
         blacklisted_value = 0
@@ -388,8 +447,18 @@ class FIFOBlacklist(Blacklist):
 
         return blacklisted_value
 
+    def try_get_blacklist_value(self, account: str, currency: str) -> Optional[int]:
+        transactions = self._blacklist.get(account, {}).get(currency)
+        if transactions is None:
+            return None
+
+        if currency == "all":
+            return transactions
+
+        return sum(tx[0] for tx in transactions)
+
     def add_currency_to_all(self, account: str, currency: str):
-        self._blacklist[account]["all"].append(currency)
+        self._blacklist[account]["all"].add(currency)
 
     def get_metrics(self):
         result = {}
@@ -408,4 +477,13 @@ class FIFOBlacklist(Blacklist):
         return result
 
     def set_blacklist(self, blacklist: dict):
+        # checkpoints created before the queues were deques and the "all" flags were sets contain lists
+        for currencies in blacklist.values():
+            for currency, transactions in currencies.items():
+                if currency == "all":
+                    if isinstance(transactions, list):
+                        currencies[currency] = set(transactions)
+                elif not isinstance(transactions, deque):
+                    currencies[currency] = deque(transactions)
+
         self._blacklist = blacklist
@@ -1,26 +1,47 @@
+import atexit
 import csv
 import json
 import logging
+import mmap
 import os
 import pickle
+import queue
 import sys
 import time
 from abc import abstractmethod, ABC
-from typing import Optional, Sequence
-from logging.handlers import RotatingFileHandler
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from logging.handlers import QueueListener, RotatingFileHandler
 
 from web3 import Web3
 
 from utilities import utils
 from policies.blacklist import Blacklist
+from utilities.block_prefetcher import BlockPrefetcher
 from utilities.ethereum_utils import EthereumUtils
 
 
+class BlockContext(NamedTuple):
+    """
+    Fields of the current block needed for every transaction, read from the block once
+    """
+    miner: str
+    base_fee: Optional[int]  # None before the London fork
+
+
 class BlacklistPolicy(ABC):
     """
     Abstract superclass defining all functions a blacklist policy needs to implement.
     """
 
+    # the attributes are accessed for every transfer, slots make these accesses faster (subclasses declare empty slots)
+    __slots__ = ("w3", "_write_queue", "_logger", "_current_block", "_current_tx", "temp_balances", "_fetched_temp_balances", "permanent_taint_list", "_balance_cache",
+                 "_balance_cache_block", "_eth_tainted", "_fully_tainted", "_checkpoint_file_blacklist", "_checkpoint_file_transactions", "_checkpoint_writer", "_pending_checkpoint", "metrics_file",
+                 "transaction_metrics_file", "account_metrics_file", "_tainted_transactions_per_account", "log_file", "_log_listener", "_tx_log", "_eth_utils", "_null_address",
+                 "_weth", "_blacklist")
+
     def __init__(self, w3: Web3, data_folder, export_metrics=True):
         self.w3 = w3
         """ Web3 instance """
@@ -34,19 +55,33 @@ class BlacklistPolicy(ABC):
         self._logger.setLevel(logging.DEBUG)
         self._current_block = -1
         self._current_tx = ""
+        # temp balances by (account, currency), and the keys whose actual balance has been added already
         self.temp_balances = None
+        self._fetched_temp_balances = None
+        # checked directly with "in" on the hot paths instead of through is_permanently_tainted
         self.permanent_taint_list = set()
+        # balances retrieved while processing the current block, cleared whenever the block changes
+        self._balance_cache = {}
+        self._balance_cache_block = -1
+        # accounts with blacklisted ETH, so that the gas fees of untainted senders are skipped with a single set lookup
+        # (only maintained for dict-based blacklists, the poison blacklist is a set of accounts already)
+        self._eth_tainted = set()
+        # accounts with the "all" flag, whose entire balance of every token they transfer is tainted, so that token transfers only require a set lookup
+        self._fully_tainted = set()
 
         for folder in [f"{data_folder}", f"{data_folder}/checkpoints", f"{data_folder}/analytics", f"{data_folder}/logs"]:
             if not os.path.exists(folder):
                 try:
                     os.makedirs(folder)
                 except FileExistsError:
-                    self._logger.warning(f"Tried to create data folder {folder} which already exists.")
+                    self._logger.warning("Tried to create data folder %s which already exists.", folder)
 
         name = self.get_policy_name().replace(' ', '_')
         self._checkpoint_file_blacklist = f"{data_folder}checkpoints/{name}_blacklist.pickle"
         self._checkpoint_file_transactions = f"{data_folder}checkpoints/{name}_transactions.pickle"
+        # checkpoints are written to disk in the background, one at a time
+        self._checkpoint_writer = ThreadPoolExecutor(max_workers=1)
+        self._pending_checkpoint = None
 
         if export_metrics:
             self.metrics_file = f"{data_folder}analytics/{name}.csv"
@@ -62,7 +97,6 @@ class BlacklistPolicy(ABC):
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(logging.INFO)
         console_handler.setFormatter(formatter)
-        self._logger.addHandler(console_handler)
         self._tainted_transactions_per_account = {}
 
         self.log_file = f"{data_folder}logs/{self.get_policy_name().replace(' ', '_')}.log"
@@ -70,10 +104,19 @@ class BlacklistPolicy(ABC):
         file_handler = RotatingFileHandler(filename=self.log_file, mode="a", maxBytes=1024*1024*100, backupCount=1, encoding=None, delay=False)
         file_handler.setFormatter(formatter)
         file_handler.setLevel(logging.DEBUG)
-        self._logger.addHandler(file_handler)
+
+        # the logger only enqueues records, formatting and writing them is done by a background thread
+        log_queue = queue.Queue(-1)
+        self._logger.addHandler(utils.UnformattedQueueHandler(log_queue))
+        self._log_listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+        self._log_listener.start()
+        atexit.register(self._log_listener.stop)
 
         self._tx_log = ""
         self._eth_utils = EthereumUtils(w3, self._logger)
+        # bound directly, since they are compared against on every transfer
+        self._null_address = self._eth_utils.null_address
+        self._weth = self._eth_utils.WETH
 
         self._blacklist: Blacklist = self.init_blacklist()
 
@@ -112,7 +155,7 @@ class BlacklistPolicy(ABC):
 
     def export_top_accounts(self, number):
         if self.account_metrics_file:
-            top_accounts = self._blacklist.get_top_accounts(number, ["ETH", self._eth_utils.WETH])
+            top_accounts = self._blacklist.get_top_accounts(number, ["ETH", self._weth])
             if top_accounts is None:
                 return
             with open(self.account_metrics_file, "w", newline="") as outfile:
@@ -133,22 +176,25 @@ class BlacklistPolicy(ABC):
                     if item[1]["incoming"] + item[1]["outgoing"] + item[1]["outgoing fee"] + item[1]["incoming fee"] > min_tx:
                         transaction_metrics_file.write(f"{item[0]},{item[1]['incoming']},{item[1]['outgoing']},{item[1]['incoming fee']},{item[1]['outgoing fee']}\n")
 
-    def clear_metrics_file(self):
+    def clear_metrics_file(self, confirmed=False):
         """
         Deletes the contents of the metrics file.
-        Asks for confirmation first.
+        Asks for confirmation first, unless it was already given.
+
+        :param confirmed: set true to skip the confirmation (e.g. if the program is not run interactively)
         """
         if self.metrics_file:
-            print("WARNING: clearing metrics file. Enter 'y' to continue.")
-            response = input(">> ")
-            if response.lower() != "y":
-                print("Exiting.")
-                exit(0)
-            else:
-                print("Clearing confirmed. Continuing.")
+            if not confirmed:
+                print("WARNING: clearing metrics file. Enter 'y' to continue.")
+                response = input(">> ")
+                if response.lower() != "y":
+                    print("Exiting.")
+                    exit(0)
+                else:
+                    print("Clearing confirmed. Continuing.")
 
-                with open(self.metrics_file, "w") as out_file:
-                    out_file.write("Block,Unique accounts,Total ETH,Tainted transactions\n")
+            with open(self.metrics_file, "w") as out_file:
+                out_file.write("Block,Unique accounts,Total ETH,Tainted transactions\n")
 
     def _increase_temp_balance(self, account, currency, amount):
         """
@@ -158,10 +204,11 @@ class BlacklistPolicy(ABC):
         :param currency: token/ETH
         :param amount: amount to increase by
         """
-        if account not in self.temp_balances or currency not in self.temp_balances[account]:
+        key = (account, currency)
+        if key not in self.temp_balances:
             self._add_to_temp_balances(account, currency)
 
-        self.temp_balances[account][currency] += amount
+        self.temp_balances[key] += amount
 
         # self._logger.debug(f"Increased temp balance of {currency} by {format(amount, '.2e')} for {account}")
 
@@ -173,12 +220,31 @@ class BlacklistPolicy(ABC):
         :param currency: token/ETH
         :param amount: amount to reduce by
         """
-        if account not in self.temp_balances or currency not in self.temp_balances[account]:
+        key = (account, currency)
+        if key not in self.temp_balances:
             self._add_to_temp_balances(account, currency)
-        self.temp_balances[account][currency] -= amount
+        self.temp_balances[key] -= amount
 
         # self._logger.debug(f"Reduced temp balance of {currency} by {format(amount, '.2e')} for {account}")
 
+    def _transfer_temp_balance(self, sender, receiver, currency, amount):
+        """
+        Moves amount from the temp balance of the sender to the temp balance of the receiver, skipping the null address.
+        Equivalent to _reduce_temp_balance and _increase_temp_balance, but with a single method call.
+
+        :param sender: address
+        :param receiver: address
+        :param currency: token/ETH
+        :param amount: amount to transfer
+        """
+        temp_balances = self.temp_balances
+        if sender != self._null_address:
+            key = (sender, currency)
+            temp_balances[key] = temp_balances.get(key, 0) - amount
+        if receiver != self._null_address:
+            key = (receiver, currency)
+            temp_balances[key] = temp_balances.get(key, 0) + amount
+
     def _add_to_temp_balances(self, account, currency, get_balance=False):
         """
         Adds the given account & currency to temp balances
@@ -190,20 +256,28 @@ class BlacklistPolicy(ABC):
         if account is None:
             return
 
-        if account not in self.temp_balances:
-            self.temp_balances[account] = {"fetched": []}
-        if currency not in self.temp_balances[account]:
+        key = (account, currency)
+        if key not in self.temp_balances:
             if get_balance:
                 balance = self._get_balance(account, currency, self._current_block)
-                self.temp_balances[account][currency] = balance
+                self.temp_balances[key] = balance
                 # self._logger.debug(self._tx_log + f"Added {account} with temp balance {format(balance, '.2e')} of {currency} (block {self._current_block}).")
             else:
-                self.temp_balances[account][currency] = 0
+                self.temp_balances[key] = 0
+
+    def _flush_log(self):
+        """
+        Blocks until all queued log records have been written
+        """
+        self._log_listener.stop()
+        self._log_listener.start()
 
     def _clear_log(self):
         """
         Clears the log file
         """
+        # records logged before clearing must not end up in the cleared file
+        self._flush_log()
         open(self.log_file, "w").close()
 
     def export_blacklist(self, target_file):
@@ -212,60 +286,112 @@ class BlacklistPolicy(ABC):
 
         :param target_file: file to write to
         """
+        blacklist = self._blacklist.get_blacklist()
+
+        # encode one entry at a time, so that the full JSON string never has to be held in memory
+        # json.dumps uses the C encoder, while json.dump falls back to the pure Python one
+        # other iterables (the queues of the FIFO blacklist) are exported as lists
         with open(target_file, "w") as outfile:
-            json.dump(self._blacklist.get_blacklist(), outfile)
+            if isinstance(blacklist, dict):
+                outfile.write("{")
+                for index, (key, value) in enumerate(blacklist.items()):
+                    outfile.write(f"{', ' if index else ''}{json.dumps(key)}: {json.dumps(value, default=list)}")
+                outfile.write("}")
+            else:
+                outfile.write("[")
+                for index, value in enumerate(blacklist):
+                    outfile.write(f"{', ' if index else ''}{json.dumps(value, default=list)}")
+                outfile.write("]")
 
-        self._logger.info(f"Successfully exported blacklist to {target_file}.")
+        self._logger.info("Successfully exported blacklist to %s.", target_file)
 
     def _save_checkpoint(self):
-        data_bl = {"block": self._current_block, "blacklist": self._blacklist.get_blacklist()}
-
+        """
+        Saves the current block, blacklist and tainted transactions as checkpoint.
+        The data is serialized immediately, but written to disk in the background.
+        """
         try:
-            with open(self._checkpoint_file_blacklist + "2", "wb") as outfile:
-                pickle.dump(data_bl, outfile, pickle.HIGHEST_PROTOCOL)
+            data_bl = pickle.dumps({"block": self._current_block, "blacklist": self._blacklist.get_blacklist()}, pickle.HIGHEST_PROTOCOL)
+            data_tx = pickle.dumps(self._tainted_transactions_per_account, pickle.HIGHEST_PROTOCOL)
+        except MemoryError:
+            self._logger.error("Ran out of memory when trying to save checkpoint. Exiting.")
+            exit(-5)
 
-            with open(self._checkpoint_file_transactions + "2", "wb") as outfile:
-                pickle.dump(self._tainted_transactions_per_account, outfile, pickle.HIGHEST_PROTOCOL)
+        # only one checkpoint is written at a time, so that an older one can never replace a newer one
+        self.wait_for_checkpoint()
+        self._pending_checkpoint = self._checkpoint_writer.submit(self._write_checkpoint, data_bl, data_tx)
 
-            if os.path.isfile(self._checkpoint_file_blacklist):
-                os.remove(self._checkpoint_file_blacklist)
-            os.rename(self._checkpoint_file_blacklist + "2", self._checkpoint_file_blacklist)
+    def _write_checkpoint(self, data_bl: bytes, data_tx: bytes):
+        """
+        Writes the serialized checkpoint data to the checkpoint files
 
-            if os.path.isfile(self._checkpoint_file_transactions):
-                os.remove(self._checkpoint_file_transactions)
-            os.rename(self._checkpoint_file_transactions + "2", self._checkpoint_file_transactions)
+        :param data_bl: pickled block and blacklist
+        :param data_tx: pickled tainted transactions
+        """
+        with open(self._checkpoint_file_blacklist + "2", "wb") as outfile:
+            outfile.write(data_bl)
 
-        except MemoryError:
-            self._logger.error("Ran out of memory when trying to save checkpoint. Exiting.")
-            exit(-5)
+        with open(self._checkpoint_file_transactions + "2", "wb") as outfile:
+            outfile.write(data_tx)
+
+        # replace the previous checkpoint atomically
+        os.replace(self._checkpoint_file_blacklist + "2", self._checkpoint_file_blacklist)
+        os.replace(self._checkpoint_file_transactions + "2", self._checkpoint_file_transactions)
 
-        self._logger.info(f"Successfully exported blacklist to {self._checkpoint_file_blacklist} and transaction records to {self._checkpoint_file_transactions}.")
+        self._logger.info("Successfully exported blacklist to %s and transaction records to %s.", self._checkpoint_file_blacklist, self._checkpoint_file_transactions)
+
+    def wait_for_checkpoint(self):
+        """
+        Blocks until the last checkpoint has been written to disk.
+        Raises any exception that occurred while writing it.
+        """
+        if self._pending_checkpoint is not None:
+            pending_checkpoint = self._pending_checkpoint
+            self._pending_checkpoint = None
+            pending_checkpoint.result()
+
+    @staticmethod
+    def _load_checkpoint_file(path):
+        """
+        Unpickles the given checkpoint file directly from a memory map, without copying its contents into a buffer first
+
+        :param path: path of the checkpoint file
+        :return: unpickled data
+        """
+        with open(path, "rb") as checkpoint:
+            # the file is read exactly once from start to end
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(checkpoint.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            with mmap.mmap(checkpoint.fileno(), 0, access=mmap.ACCESS_READ) as mapped_checkpoint:
+                return pickle.loads(mapped_checkpoint)
 
     def load_from_checkpoint(self):
+        self.wait_for_checkpoint()
         try:
-            with open(self._checkpoint_file_blacklist, "rb") as checkpoint:
-                data_bl = pickle.load(checkpoint)
-            with open(self._checkpoint_file_transactions, "rb") as checkpoint:
-                data_tx = pickle.load(checkpoint)
+            data_bl = self._load_checkpoint_file(self._checkpoint_file_blacklist)
+            data_tx = self._load_checkpoint_file(self._checkpoint_file_transactions)
         except FileNotFoundError:
-            self._logger.info(f"No file found under path {self._checkpoint_file_blacklist}. Continuing without loading checkpoint.")
+            self._logger.info("No file found under path %s. Continuing without loading checkpoint.", self._checkpoint_file_blacklist)
             return 0, {}, {}
         except MemoryError:
-            self._logger.error(f"Checkpoint file is too large to be loaded into RAM. Exiting.")
+            self._logger.error("Checkpoint file is too large to be loaded into RAM. Exiting.")
             exit(-5)
         last_block = data_bl["block"]
         saved_blacklist = data_bl["blacklist"]
         tainted_transactions = data_tx
-        self._logger.info(f"Loading saved data from {self._checkpoint_file_blacklist}. Last block was {last_block}.")
+        self._logger.info("Loading saved data from %s. Last block was %s.", self._checkpoint_file_blacklist, last_block)
         return last_block, saved_blacklist, tainted_transactions
 
-    def propagate_blacklist(self, start_block, block_amount, load_checkpoint=False):
+    def propagate_blacklist(self, start_block, block_amount, load_checkpoint=False, clear_confirmed=False, prefetch_blocks=8, sanity_check=False):
         """
         Propagates the blacklist from the start block
 
         :param start_block: block to start from
         :param block_amount: amount of blocks to propagate for
         :param load_checkpoint: whether the program should attempt to load an existing checkpoint
+        :param clear_confirmed: whether clearing the metrics file was already confirmed
+        :param prefetch_blocks: maximum amount of blocks whose data is retrieved ahead in the background while the current block is processed
+        :param sanity_check: whether to compare all blacklisted values to the actual balances at the end (requires one request per blacklisted value)
         """
         start_time = time.time()
 
@@ -285,55 +411,57 @@ class BlacklistPolicy(ABC):
             saved_block, saved_blacklist, tainted_transactions = self.load_from_checkpoint()
             # only use loaded data if saved block is between start and end block
             if start_block + block_amount - 1 == saved_block:
-                self._blacklist.set_blacklist(saved_blacklist)
+                self._set_blacklist(saved_blacklist)
                 self._tainted_transactions_per_account = tainted_transactions
                 self._logger.info("Target already reached. Exiting.")
                 return
             if start_block < saved_block < start_block + block_amount - 1:
                 loop_start_block = saved_block
-                self._blacklist.set_blacklist(saved_blacklist)
+                self._set_blacklist(saved_blacklist)
                 self._tainted_transactions_per_account = tainted_transactions
-                self._logger.info(f"Continuing from saved state. Progress is {format((loop_start_block - start_block) / block_amount * 100, '.2f')}%")
+                self._logger.info("Continuing from saved state. Progress is %.2f%%", (loop_start_block - start_block) / block_amount * 100)
             else:
                 self._clear_log()
-                self.clear_metrics_file()
-                self._logger.info(f"Saved block {saved_block} is not in the correct range. Starting from start block.")
+                self.clear_metrics_file(confirmed=clear_confirmed)
+                self._logger.info("Saved block %s is not in the correct range. Starting from start block.", saved_block)
                 print("Starting amounts:")
                 total_eth = self.print_blacklisted_amount()
                 self.export_metrics(total_eth)
         else:
             self._clear_log()
-            self.clear_metrics_file()
+            self.clear_metrics_file(confirmed=clear_confirmed)
             print("Starting amounts:")
             total_eth = self.print_blacklisted_amount()
             self.export_metrics(total_eth)
 
         self.export_top_accounts(10)
 
-        for i in range(loop_start_block, start_block + block_amount):
-            self._process_block(i)
-
-            if (i - start_block) % interval == 0 and i - loop_start_block > 0 and i < start_block + block_amount:
-                total_blocks_scanned = i - start_block
-                blocks_scanned = i - loop_start_block
-                elapsed_time = time.time() - start_time
-                blocks_remaining = block_amount - total_blocks_scanned
-                self._logger.info(
-                    f"{total_blocks_scanned} ({format(total_blocks_scanned / block_amount * 100, '.2f')}%) blocks scanned, " +
-                    f" {utils.format_seconds_as_time(elapsed_time)} elapsed ({utils.format_seconds_as_time(blocks_remaining * (elapsed_time / blocks_scanned))} remaining, " +
-                    f" {format(blocks_scanned / elapsed_time * 60, '.0f')} blocks/min). Last block: {self._current_block:,}")
-                if self.get_policy_name() != "Poison":
-                    print("Blacklisted amounts:")
-                    total_eth = self.print_blacklisted_amount()
-                else:
-                    total_eth = None
-                self._save_checkpoint()
-                self.export_metrics(total_eth)
-                top_accounts = self._blacklist.get_top_accounts(5, ["ETH", self._eth_utils.WETH])
-                if top_accounts:
-                    print("Top accounts:")
-                    for account in reversed(top_accounts):
-                        print(f"\t{account}: {self._format_exp(top_accounts[account])} ETH")
+        # retrieve the data of the next blocks in the background, so that the node is never idle while a block is processed
+        with BlockPrefetcher(self._eth_utils, loop_start_block, start_block + block_amount, depth=prefetch_blocks) as prefetcher:
+            for i, block_data in prefetcher:
+                self._process_block(i, block_data)
+
+                if (i - start_block) % interval == 0 and i - loop_start_block > 0 and i < start_block + block_amount:
+                    total_blocks_scanned = i - start_block
+                    blocks_scanned = i - loop_start_block
+                    elapsed_time = time.time() - start_time
+                    blocks_remaining = block_amount - total_blocks_scanned
+                    self._logger.info(
+                        f"{total_blocks_scanned} ({format(total_blocks_scanned / block_amount * 100, '.2f')}%) blocks scanned, " +
+                        f" {utils.format_seconds_as_time(elapsed_time)} elapsed ({utils.format_seconds_as_time(blocks_remaining * (elapsed_time / blocks_scanned))} remaining, " +
+                        f" {format(blocks_scanned / elapsed_time * 60, '.0f')} blocks/min). Last block: {self._current_block:,}")
+                    if self.get_policy_name() != "Poison":
+                        print("Blacklisted amounts:")
+                        total_eth = self.print_blacklisted_amount()
+                    else:
+                        total_eth = None
+                    self._save_checkpoint()
+                    self.export_metrics(total_eth)
+                    top_accounts = self._blacklist.get_top_accounts(5, ["ETH", self._weth])
+                    if top_accounts:
+                        print("Top accounts:")
+                        for account in reversed(top_accounts):
+                            print(f"\t{account}: {self._format_exp(top_accounts[account])} ETH")
 
         if self.get_policy_name() != "Poison":
             print("Blacklisted amounts:")
@@ -341,50 +469,57 @@ class BlacklistPolicy(ABC):
             if self.metrics_file:
                 self.export_metrics(total_eth)
 
-            print("***** Sanity Check *****")
-            self.sanity_check()
-            print("Sanity check complete.")
+            if sanity_check:
+                print("***** Sanity Check *****")
+                self.sanity_check()
+                print("Sanity check complete.")
 
         self._save_checkpoint()
+        self.wait_for_checkpoint()
         end_time = time.time()
         self._logger.info(
             f"Propagation complete. Total time: {utils.format_seconds_as_time(end_time - start_time)}, performance: " +
             f"{format(((block_amount + start_block) - loop_start_block) / (end_time - start_time) * 60, '.0f')} blocks/min")
 
-    def _process_block(self, block: int):
+    def _process_block(self, block: int, block_data=None):
         """
         Checks the given block for tainted transactions and change the blacklist accordingly
 
         :param block: block number
+        :param block_data: (full block, receipts, traces) of the block if already retrieved, see EthereumUtils.get_block_data
         """
-        # retrieve all necessary block data
-        full_block = self.w3.eth.get_block(block, full_transactions=True)
+        # retrieve all necessary block data in a single request
+        if block_data is None:
+            block_data = self._eth_utils.get_block_data(block)
+        full_block, receipts, traces = block_data
         transactions: Sequence = full_block["transactions"]
-        receipts = self._eth_utils.get_block_receipts(block)
-        traces = self.w3.parity.trace_block(block)
+        block_context = BlockContext(miner=sys.intern(full_block["miner"]), base_fee=full_block.get("baseFeePerGas"))
+        traces = deque(traces)
 
         # update progress
         self._current_block = block
 
         # clear temp balances
         self.temp_balances = {}
+        self._fetched_temp_balances = set()
 
         for transaction, transaction_log in zip(transactions, receipts):
             internal_transactions = []
 
-            # update progress
-            self._tx_log = f"Transaction https://etherscan.io/tx/{transaction['hash'].hex()} | "
-            self._current_tx = transaction['hash'].hex()
+            # update progress, the prefix is only built once per transaction and passed to the log calls as an argument
+            tx_hash = transaction["hash"].hex()
+            self._tx_log = f"Transaction https://etherscan.io/tx/{tx_hash} | "
+            self._current_tx = tx_hash
 
             while traces:
                 # exclude block rewards
                 if "transactionHash" not in traces[0]:
-                    traces.pop(0)
+                    traces.popleft()
                     continue
                 # find traces matching the current transaction
-                elif traces[0]["transactionHash"] == transaction["hash"].hex():
+                elif traces[0]["transactionHash"] == tx_hash:
                     # process internal tx and make it readable by check_transaction
-                    internal_transaction_event = self._eth_utils.internal_transaction_to_event(traces.pop(0))
+                    internal_transaction_event = self._eth_utils.internal_transaction_to_event(traces.popleft())
                     # exclude internal transactions with no value
                     if internal_transaction_event:
                         internal_transactions.append(internal_transaction_event)
@@ -392,27 +527,29 @@ class BlacklistPolicy(ABC):
                     break
 
             try:
-                self._process_transaction(transaction_log=transaction_log, transaction=transaction, full_block=full_block, internal_transactions=internal_transactions)
+                self._process_transaction(transaction_log=transaction_log, transaction=transaction, block_context=block_context, internal_transactions=internal_transactions)
             except Exception as e:
-                self._logger.error(self._tx_log + f"Exception '{e}' occurred while processing transaction.")
+                self._logger.error("%sException '%s' occurred while processing transaction.", self._tx_log, e)
                 raise e
 
-    def _process_transaction(self, transaction_log, transaction, full_block, internal_transactions):
+    def _process_transaction(self, transaction_log, transaction, block_context: BlockContext, internal_transactions):
         """
         Processes the given transaction and changes the blacklist accordingly
 
         :param transaction_log: transaction receipt (list of events)
         :param transaction: full transaction
-        :param full_block: full block
+        :param block_context: miner and base fee of the block
         :param internal_transactions: all internal transactions that should be processed
         """
-        sender = transaction["from"]
+        # interned like the addresses of the events, see utils.to_checksum_address
+        sender = sys.intern(transaction["from"])
         receiver = transaction["to"]
 
         # skip failed transactions
         if transaction_log["status"] == 0:
             # self._logger.debug(self._tx_log + "Smart contract/transaction execution failed, only checking gas.")
-            self._process_gas_fees(transaction_log, transaction, full_block, sender)
+            if self._has_eth_taint():
+                self._process_gas_fees(transaction_log, transaction, block_context, sender)
             return
 
         # skip the remaining code if there were no smart contract events
@@ -421,19 +558,22 @@ class BlacklistPolicy(ABC):
                 self._process_event(internal_transactions[0])
 
             # if the sender (still) has any blacklisted ETH, taint the paid gas fees
-            self._process_gas_fees(transaction_log, transaction, full_block, sender)
+            if self._has_eth_taint():
+                self._process_gas_fees(transaction_log, transaction, block_context, sender)
             return
 
         # get all transfers
         events = self._eth_utils.get_all_events_of_type_in_tx(transaction_log, ["Transfer", "Deposit", "Withdrawal"])
 
+        self._prefetch_temp_balances(events, internal_transactions)
+
         is_weth_transaction = self._eth_utils.is_weth(receiver)
 
         # internal transactions to and from WETH need to match an event, so they cannot be processed alone
         if transaction["value"] and not is_weth_transaction:
             # process first internal transaction if the transaction transfers ETH
             if not internal_transactions:
-                self._logger.error(self._tx_log + f"No internal transactions found for transaction with value {format(transaction['value'], '.2e')}.")
+                self._logger.error("%sNo internal transactions found for transaction with value %.2e.", self._tx_log, transaction["value"])
                 exit(-1)
             self._process_event(internal_transactions.pop(0))
 
@@ -455,11 +595,50 @@ class BlacklistPolicy(ABC):
         # process any remaining internal transactions
         for internal_tx in internal_transactions:
             if internal_tx["event"] == "Deposit" or internal_tx["event"] == "Withdrawal":
-                self._logger.warning(self._tx_log + f"Unaccounted for event of type {internal_tx['event']}.")
+                self._logger.warning("%sUnaccounted for event of type %s.", self._tx_log, internal_tx["event"])
                 exit(-1)
             self._process_event(internal_tx)
 
-        self._process_gas_fees(transaction_log, transaction, full_block, sender)
+        if self._has_eth_taint():
+            self._process_gas_fees(transaction_log, transaction, block_context, sender)
+
+    def _prefetch_temp_balances(self, events, internal_transactions):
+        """
+        Retrieves the balances of all senders in the transaction that are blacklisted for the sent currency with a single batched request,
+        instead of one request each when _transfer_taint first needs their temp balance.
+        Taint received within the same transaction is not anticipated, those balances are still retrieved one by one.
+
+        :param events: transfer, deposit and withdrawal events of the transaction
+        :param internal_transactions: internal transactions of the transaction
+        """
+        balances = set()
+        for event in chain(events, internal_transactions):
+            event_type = event["event"]
+            if event_type == "Deposit" or event_type == "Withdrawal":
+                # internal deposits and withdrawals are only matched to the events, not processed
+                if event["address"] == "ETH" or not self._eth_utils.is_weth(event["address"]) or not event["args"]["wad"]:
+                    continue
+                key = (event["args"]["dst"], "ETH") if event_type == "Deposit" else (event["args"]["src"], self._weth)
+            # transfers without value are skipped by some policies before the balance is needed
+            elif not event["args"]["value"]:
+                continue
+            else:
+                currency = event["address"]
+                if currency != "ETH":
+                    currency = utils.to_checksum_address(currency)
+                key = (event["args"]["from"], currency)
+
+            # permanently tainted accounts transfer their full amount without needing a balance
+            if key in balances or key in self._fetched_temp_balances or key[0] in self.permanent_taint_list:
+                continue
+            if self._blacklist.is_blacklisted(*key):
+                balances.add(key)
+
+        block = self._current_block
+        balances = [key for key in balances if (key[0], key[1], block) not in self._balance_cache]
+        # a single balance is retrieved just as fast by _get_balance itself
+        if len(balances) > 1:
+            self._prefetch_balances(balances, block)
 
     def _record_tainted_transaction(self, sender, receiver, fee=False):
         """
@@ -495,15 +674,15 @@ class BlacklistPolicy(ABC):
                 return
 
             self._add_to_temp_balances(dst, "ETH")
-            self._add_to_temp_balances(dst, self._eth_utils.WETH)
+            self._add_to_temp_balances(dst, self._weth)
 
-            transferred_amount = self._transfer_taint(dst, dst, value, "ETH", self._eth_utils.WETH)
+            transferred_amount = self._transfer_taint(dst, dst, value, "ETH", self._weth)
 
-            if transferred_amount > 0:
-                self._logger.debug(self._tx_log + f"Processed Withdrawal. Converted {self._format_exp(transferred_amount)} tainted ({self._format_exp(value)} total) ETH of {dst} to WETH.")
+            if transferred_amount > 0 and self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("%sProcessed Withdrawal. Converted %s tainted (%s total) ETH of %s to WETH.", self._tx_log, self._format_exp(transferred_amount), self._format_exp(value), dst)
 
             self._reduce_temp_balance(dst, "ETH", value)
-            self._increase_temp_balance(dst, self._eth_utils.WETH, value)
+            self._increase_temp_balance(dst, self._weth, value)
 
         elif event["event"] == "Withdrawal":
             src = event["args"]["src"]
@@ -512,46 +691,40 @@ class BlacklistPolicy(ABC):
                 return
 
             self._add_to_temp_balances(src, "ETH")
-            self._add_to_temp_balances(src, self._eth_utils.WETH)
+            self._add_to_temp_balances(src, self._weth)
 
-            transferred_amount = self._transfer_taint(src, src, value, self._eth_utils.WETH, "ETH")
+            transferred_amount = self._transfer_taint(src, src, value, self._weth, "ETH")
 
-            if transferred_amount > 0:
-                self._logger.debug(self._tx_log + f"Processed Withdrawal. Converted {self._format_exp(transferred_amount)} tainted ({self._format_exp(value)} total) WETH of {src} to ETH.")
+            if transferred_amount > 0 and self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("%sProcessed Withdrawal. Converted %s tainted (%s total) WETH of %s to ETH.", self._tx_log, self._format_exp(transferred_amount), self._format_exp(value), src)
 
             self._increase_temp_balance(src, "ETH", value)
-            self._reduce_temp_balance(src, self._eth_utils.WETH, value)
+            self._reduce_temp_balance(src, self._weth, value)
 
         # Transfer event, incl. internal transactions
         else:
             currency = event["address"]
             if currency != "ETH":
-                currency = Web3.toChecksumAddress(currency)
+                currency = utils.to_checksum_address(currency)
             transfer_sender = event['args']['from']
             transfer_receiver = event['args']['to']
             amount = event['args']['value']
 
-            for account in transfer_sender, transfer_receiver:
-                # skip null address
-                if account == self._eth_utils.null_address:
-                    continue
-
-                if currency != "ETH" and self.is_blacklisted(address=account, currency="all"):
-                    self.fully_taint_token(account, currency)
-
-                self._add_to_temp_balances(account, currency)
+            # taint the entire token balance of fully blacklisted accounts, skipping the null address
+            if currency != "ETH":
+                for account in transfer_sender, transfer_receiver:
+                    if account in self._fully_tainted and account != self._null_address:
+                        self.fully_taint_token(account, currency)
 
             # if the sender is blacklisted, transfer taint to receiver
+            # (its temp balance is added by _get_temp_balance if it is needed)
             transferred_amount = self._transfer_taint(transfer_sender, transfer_receiver, amount, currency)
 
             if transferred_amount > 0:
                 self._record_tainted_transaction(transfer_sender, transfer_receiver)
 
             # update balances
-            if transfer_sender != self._eth_utils.null_address:
-                self._reduce_temp_balance(transfer_sender, currency, amount)
-            if transfer_receiver != self._eth_utils.null_address:
-                self._increase_temp_balance(transfer_receiver, currency, amount)
+            self._transfer_temp_balance(transfer_sender, transfer_receiver, currency, amount)
 
             # self._logger.debug(self._tx_log + f"Transferred {format(amount, '.2e')} temp balance of {currency} from {transfer_sender} to {transfer_receiver} ")
 
@@ -584,7 +757,7 @@ class BlacklistPolicy(ABC):
             # do not add the token to the blacklist if the balance is 0, 0-values in the blacklist can lead to issues
             if entire_balance > 0:
                 self.add_to_blacklist(address=account, amount=entire_balance, currency=currency, total_amount=entire_balance)
-                self._logger.info(self._tx_log + f"Tainted entire balance ({self._format_exp(entire_balance)}) of token {currency} for account {account}.")
+                self._logger.info("%sTainted entire balance (%s) of token %s for account %s.", self._tx_log, self._format_exp(entire_balance), currency, account)
 
     def add_to_blacklist(self, address: str, amount: int, currency: str, total_amount: int = None):
         """
@@ -596,12 +769,14 @@ class BlacklistPolicy(ABC):
         :param amount: amount to be added
         """
         # do not taint null address
-        if address == self._eth_utils.null_address:
+        if address == self._null_address:
             return
         self._blacklist.add_to_blacklist(address, currency=currency, amount=amount, total_amount=total_amount)
+        if currency == "ETH":
+            self._update_eth_tainted(address)
 
-        if amount > 0 and self.get_policy_name() != "Haircut":
-            self._logger.debug(self._tx_log + f"Added {self._format_exp(amount)} of blacklisted currency {currency} to account {address}.")
+        if amount > 0 and self.get_policy_name() != "Haircut" and self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("%sAdded %s of blacklisted currency %s to account %s.", self._tx_log, self._format_exp(amount), currency, address)
 
     def is_blacklisted(self, address: str, currency: Optional[str] = None) -> bool:
         """
@@ -611,7 +786,46 @@ class BlacklistPolicy(ABC):
         :param currency: token or ETH; if not given, checks if account has any blacklisted currency
         :return: True if in blacklist
         """
-        return self.is_permanently_tainted(address) or self._blacklist.is_blacklisted(address, currency)
+        return address in self.permanent_taint_list or self._blacklist.is_blacklisted(address, currency)
+
+    def _has_eth_taint(self) -> bool:
+        """
+        Checks whether any account possesses blacklisted ETH, otherwise no gas fee can be tainted and processing them can be skipped
+
+        :return: False if no account has blacklisted ETH and no account is permanently tainted
+        """
+        return bool(self._eth_tainted or self.permanent_taint_list)
+
+    def _has_tainted_eth(self, address: str) -> bool:
+        """
+        Equivalent to is_blacklisted(address, "ETH") for dict-based blacklists, but only requires set lookups
+
+        :param address: Ethereum address
+        :return: True if the address is permanently tainted or possesses blacklisted ETH
+        """
+        return address in self._eth_tainted or address in self.permanent_taint_list
+
+    def _update_eth_tainted(self, address: str):
+        """
+        Updates the set of accounts with blacklisted ETH after the ETH blacklisted for the given address has changed
+
+        :param address: Ethereum address
+        """
+        if self._blacklist.is_blacklisted(address, "ETH"):
+            self._eth_tainted.add(address)
+        else:
+            self._eth_tainted.discard(address)
+
+    def _set_blacklist(self, blacklist):
+        """
+        Overwrites the blacklist, e.g. with one loaded from a checkpoint
+
+        :param blacklist: new blacklist
+        """
+        self._blacklist.set_blacklist(blacklist)
+        if isinstance(blacklist, dict):
+            self._eth_tainted = {account for account, currencies in blacklist.items() if "ETH" in currencies}
+            self._fully_tainted = {account for account, currencies in blacklist.items() if "all" in currencies}
 
     def _add_currency_to_all(self, address, currency):
         return self._blacklist.add_currency_to_all(address, currency)
@@ -619,6 +833,16 @@ class BlacklistPolicy(ABC):
     def get_blacklist_value(self, account, currency):
         return self._blacklist.get_account_blacklist_value(account, currency)
 
+    def try_get_blacklist_value(self, account, currency) -> Optional[int]:
+        """
+        Retrieves the blacklisted value of the given account and currency with a single lookup, not considering permanent taint
+
+        :param account: Ethereum account
+        :param currency: token or ETH
+        :return: blacklisted value, None if the account does not possess blacklisted value of the currency
+        """
+        return self._blacklist.try_get_blacklist_value(account, currency)
+
     def get_blacklisted_amount(self) -> dict:
         """
         Gets the total blacklisted amounts for each currency
@@ -634,12 +858,14 @@ class BlacklistPolicy(ABC):
         :return: total blacklisted ETH (ETH & WETH)
         """
         blacklisted_amounts = self.get_blacklisted_amount()
+        # retrieve all token names and symbols at once
+        names_symbols = self._eth_utils.get_contract_names_symbols([currency for currency in blacklisted_amounts if currency != "ETH"])
         print("{")
         for currency in blacklisted_amounts:
             currency_address = currency
             name, symbol = "Ether", "ETH"
             if currency != "ETH":
-                name, symbol = self._eth_utils.get_contract_name_symbol(currency)
+                name, symbol = names_symbols[currency]
             else:
                 currency_address = "n/a"
             if symbol is None:
@@ -651,11 +877,11 @@ class BlacklistPolicy(ABC):
             if len(symbol) > 5:
                 symbol = symbol[0:4] + ".."
             print(f"\t{name: <25}\t{symbol: <6} ({currency_address: <42}):\t{format(blacklisted_amounts[currency], '.5e')},")
-        if self._eth_utils.WETH not in blacklisted_amounts:
-            blacklisted_amounts[self._eth_utils.WETH] = 0
+        if self._weth not in blacklisted_amounts:
+            blacklisted_amounts[self._weth] = 0
         if "ETH" not in blacklisted_amounts:
             blacklisted_amounts["ETH"] = 0
-        total_eth = blacklisted_amounts['ETH'] + blacklisted_amounts[self._eth_utils.WETH]
+        total_eth = blacklisted_amounts['ETH'] + blacklisted_amounts[self._weth]
         print(f"\t{'Ether + Wrapped Ether': <25}\t{'ETH + WETH:': <52}" +
               f"\t{format(total_eth, '.5e')},")
         print("}")
@@ -670,12 +896,15 @@ class BlacklistPolicy(ABC):
         :param currency: token address
         """
         ret_val = self._blacklist.remove_from_blacklist(address, amount, currency)
+        if currency == "ETH":
+            self._update_eth_tainted(address)
 
         # do not log this event for haircut, since the log file gets too large
         if ret_val > 0 and self.get_policy_name() != "Haircut":
-            self._logger.debug(self._tx_log + f"Removed {self._format_exp(ret_val)} of blacklisted currency {currency} from account {address}.")
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("%sRemoved %s of blacklisted currency %s from account %s.", self._tx_log, self._format_exp(ret_val), currency, address)
         elif ret_val == -1:
-            self._logger.debug(self._tx_log + f"Removed address {address} from blacklist.")
+            self._logger.debug("%sRemoved address %s from blacklist.", self._tx_log, address)
 
         return ret_val
 
@@ -699,13 +928,55 @@ class BlacklistPolicy(ABC):
         :param block: block number
         :return: balance, 0 if an error occurred
         """
-        balance = self._eth_utils.get_balance(account, currency, block)
+        self._clear_outdated_balance_cache()
+
+        key = (account, currency, block)
+        balance = self._balance_cache.get(key)
+        if balance is not None:
+            return balance
+
+        balance = self._replace_balance_error(account, currency, self._eth_utils.get_balance(account, currency, block))
+
+        self._balance_cache[key] = balance
+        return balance
+
+    def _prefetch_balances(self, balances: List[Tuple[str, str]], block: int):
+        """
+        Retrieves the given balances with batched requests and adds them to the balance cache, so that _get_balance does not need to query the node for them.
+        Balances that cannot be retrieved this way are left to _get_balance.
+
+        :param balances: list of (account, currency), currency is ETH or a token address
+        :param block: block number
+        """
+        self._clear_outdated_balance_cache()
+
+        for (account, currency, balance_block), balance in self._eth_utils.prefetch_balances(balances, block).items():
+            self._balance_cache[(account, currency, balance_block)] = self._replace_balance_error(account, currency, balance)
+
+    def _clear_outdated_balance_cache(self):
+        """
+        Clears the balance cache if the current block has changed since it was filled
+        """
+        if self._current_block != self._balance_cache_block:
+            self._balance_cache.clear()
+            self._balance_cache_block = self._current_block
+
+    def _replace_balance_error(self, account, currency, balance) -> int:
+        """
+        Replaces the error markers returned for balances that could not be retrieved with 0
+
+        :param account: Ethereum account
+        :param currency: token address/ETH
+        :param balance: balance as returned by EthereumUtils.get_balance or prefetch_balances
+        :return: balance, 0 if an error occurred
+        """
         if balance == -1:
-            self._logger.debug(self._tx_log + f"Balance for token {currency} and account {account} could not be retrieved.")
+            self._logger.debug("%sBalance for token %s and account %s could not be retrieved.", self._tx_log, currency, account)
             return 0
-        if balance == -2:
-            self._logger.debug(self._tx_log + f"Balance of account {account} for token {currency} could not be retrieved. The smart contract does not support 'balanceOf'.")
+        elif balance == -2:
+            self._logger.debug("%sBalance of account %s for token %s could not be retrieved. The smart contract does not support 'balanceOf'.", self._tx_log, account, currency)
             return 0
+
         return balance
 
     def add_account_to_blacklist(self, address: str, block: int):
@@ -717,16 +988,30 @@ class BlacklistPolicy(ABC):
         :param block: block at which the current balance should be blacklisted
         """
         self._blacklist.add_account_to_blacklist(address, block)
+        self._fully_tainted.add(address)
 
         # blacklist all ETH
         eth_balance = self._get_balance(account=address, currency="ETH", block=block)
         self.add_to_blacklist(address, amount=eth_balance, currency="ETH", total_amount=eth_balance)
 
         # blacklist all WETH
-        self.fully_taint_token(address, self._eth_utils.WETH, overwrite=True, block=block)
+        self.fully_taint_token(address, self._weth, overwrite=True, block=block)
 
-        self._logger.info(f"Added entire account of {address} to the blacklist.")
-        self._logger.info(f"Blacklisted entire balance of {self._format_exp(eth_balance)} wei (ETH) of account {address}")
+        self._logger.info("Added entire account of %s to the blacklist.", address)
+        self._logger.info("Blacklisted entire balance of %s wei (ETH) of account %s", self._format_exp(eth_balance), address)
+
+    def add_accounts_to_blacklist(self, addresses: List[str], block: int):
+        """
+        Adds multiple entire accounts to the blacklist.
+        Their ETH and WETH balances are retrieved with a single batched request beforehand.
+
+        :param addresses: Ethereum addresses to blacklist
+        :param block: block at which the current balances should be blacklisted
+        """
+        self._prefetch_balances([(address, currency) for address in addresses for currency in ["ETH", self._weth]], block)
+
+        for address in addresses:
+            self.add_account_to_blacklist(address, block)
 
     @abstractmethod
     def _transfer_taint(self, from_address: str, to_address: str, amount_sent: int, currency: str, currency_2: str = None) -> int:
@@ -744,14 +1029,14 @@ class BlacklistPolicy(ABC):
         pass
 
     @abstractmethod
-    def _process_gas_fees(self, transaction_log, transaction, full_block, sender):
+    def _process_gas_fees(self, transaction_log, transaction, block_context: BlockContext, sender):
         """
         Processes any taint transferred by the gas fees of the given transaction.
         Different implementation for every policy.
 
         :param transaction_log: transaction receipt
         :param transaction: full transaction
-        :param full_block: full block
+        :param block_context: miner and base fee of the block
         :param sender: transaction sender
         """
         pass
@@ -764,8 +1049,12 @@ class BlacklistPolicy(ABC):
 
         full_blacklist = self.get_blacklist()
 
-        if self.is_blacklisted(self._eth_utils.null_address):
-            self._logger.warning(f"Null address is blacklisted. Values: {full_blacklist[self._eth_utils.null_address]}")
+        if self.is_blacklisted(self._null_address):
+            self._logger.warning("Null address is blacklisted. Values: %s", full_blacklist[self._null_address])
+
+        # retrieve all balances with batched requests instead of one request per blacklisted value
+        self._prefetch_balances([(account, currency) for account in full_blacklist for currency in full_blacklist[account] if currency != "all"], self._current_block + 1)
+
         for account in full_blacklist:
             for currency in full_blacklist[account]:
                 if currency == "all":
@@ -773,8 +1062,8 @@ class BlacklistPolicy(ABC):
                 blacklist_value = self.get_blacklist_value(account, currency)
                 balance = self._get_balance(account, currency, self._current_block + 1)
                 if blacklist_value > balance:
-                    self._logger.warning(f"Blacklist value {self._format_exp(blacklist_value)} for account {account} and currency {currency} is greater than balance {self._format_exp(balance)} " +
-                                         f"(difference: {self._format_exp(blacklist_value - balance)})")
+                    self._logger.warning("Blacklist value %s for account %s and currency %s is greater than balance %s (difference: %s)", self._format_exp(blacklist_value), account, currency,
+                                         self._format_exp(balance), self._format_exp(blacklist_value - balance))
 
     def _get_temp_balance(self, account, currency) -> int:
         """
@@ -785,13 +1074,14 @@ class BlacklistPolicy(ABC):
         :param currency: token address or ETH
         :return: temp balance as int
         """
-        if account not in self.temp_balances or currency not in self.temp_balances[account]:
+        key = (account, currency)
+        if key not in self.temp_balances:
             self._add_to_temp_balances(account, currency)
-        if currency not in self.temp_balances[account]["fetched"]:
-            self.temp_balances[account][currency] += self._get_balance(account, currency, self._current_block)
-            self.temp_balances[account]["fetched"].append(currency)
+        if key not in self._fetched_temp_balances:
+            self.temp_balances[key] += self._get_balance(account, currency, self._current_block)
+            self._fetched_temp_balances.add(key)
 
-        return self.temp_balances[account][currency]
+        return self.temp_balances[key]
 
     def _format_exp(self, number: Optional[int], decimals: int = 2) -> str:
         """
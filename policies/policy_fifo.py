@@ -1,3 +1,4 @@
+import logging
 from typing import Optional
 
 from policies.blacklist import FIFOBlacklist
@@ -10,6 +11,8 @@ class FIFOPolicy(BlacklistPolicy):
     Keeps track of incoming transactions to tainted accounts and transfers taint in the order it was received.
     """
 
+    __slots__ = ()
+
     def init_blacklist(self):
         return FIFOBlacklist()
 
@@ -22,39 +25,42 @@ class FIFOPolicy(BlacklistPolicy):
 
         transferred_amount = 0
 
-        if self.is_permanently_tainted(from_address):
+        permanently_tainted = from_address in self.permanent_taint_list
+        tracked_value = None if permanently_tainted else self._blacklist.try_get_tracked_value(from_address, currency)
+
+        if permanently_tainted:
             transferred_amount = amount_sent
 
-        elif self.is_blacklisted(from_address, currency):
+        elif tracked_value is not None:
             # amount by which the balance is higher than the value tracked by the blacklist
-            untracked_balance = self._get_temp_balance(from_address, currency) - self._blacklist.get_tracked_value(from_address, currency)
-            if untracked_balance < 0:
-                self._logger.warning(self._tx_log + f"Tracked value {self._format_exp(self._blacklist.get_tracked_value(from_address, currency), 10)} for account {from_address} is higher than " +
-                                     f"temp balance {self._format_exp(self._get_temp_balance(from_address, currency), 10)} (currency: {currency}); difference: " +
-                                     f"{self._format_exp(self._blacklist.get_tracked_value(from_address, currency) - self._get_temp_balance(from_address, currency))}")
+            temp_balance = self._get_temp_balance(from_address, currency)
+            untracked_balance = temp_balance - tracked_value
+            if untracked_balance < 0 and self._logger.isEnabledFor(logging.WARNING):
+                self._logger.warning("%sTracked value %s for account %s is higher than temp balance %s (currency: %s); difference: %s", self._tx_log,
+                                     self._format_exp(tracked_value, 10), from_address, self._format_exp(temp_balance, 10), currency, self._format_exp(tracked_value - temp_balance))
 
             # if difference is higher than sent amount, do not send any taint
             sent_amount_tracked = amount_sent - untracked_balance
             if sent_amount_tracked > 0:
                 transferred_amount = self.remove_from_blacklist(from_address, sent_amount_tracked, currency)
 
-        if (self.is_blacklisted(to_address, currency) or transferred_amount > 0) and to_address is not None:
+        if to_address is not None and (transferred_amount > 0 or self.is_blacklisted(to_address, currency)):
             self.add_to_blacklist(address=to_address, amount=transferred_amount, currency=currency_2, total_amount=amount_sent)
 
-            if currency == currency_2 and transferred_amount > 0:
-                self._logger.debug(self._tx_log + f"Transferred {self._format_exp(transferred_amount)} taint " +
-                                   f"({self._format_exp(amount_sent)} total) of {currency} from {from_address} to {to_address}")
+            if currency == currency_2 and transferred_amount > 0 and self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("%sTransferred %s taint (%s total) of %s from %s to %s", self._tx_log, self._format_exp(transferred_amount), self._format_exp(amount_sent),
+                                   currency, from_address, to_address)
 
         return transferred_amount
 
-    def _process_gas_fees(self, transaction_log, transaction, full_block, sender):
+    def _process_gas_fees(self, transaction_log, transaction, block_context, sender):
         gas_price = transaction["gasPrice"]
-        base_fee = full_block["baseFeePerGas"]
+        base_fee = block_context.base_fee
         gas_used = transaction_log["gasUsed"]
-        miner = full_block["miner"]
+        miner = block_context.miner
 
         # return if neither sender nor miner are blacklisted
-        if not (self.is_blacklisted(sender, "ETH") or self.is_blacklisted(miner, "ETH")):
+        if not (self._has_tainted_eth(sender) or self._has_tainted_eth(miner)):
             return
 
         total_fee_paid = gas_price * gas_used
@@ -72,6 +78,6 @@ class FIFOPolicy(BlacklistPolicy):
         self._reduce_temp_balance(sender, "ETH", total_fee_paid - paid_to_miner)
 
         if tainted_fee > 0:
-            self._logger.debug(
-                self._tx_log + f"Fee: Removed {self._format_exp(tainted_fee)} wei taint from {sender}, and transferred {self._format_exp(tainted_fee_to_miner)} wei of which to miner {miner}")
+            self._logger.debug("%sFee: Removed %s wei taint from %s, and transferred %s wei of which to miner %s", self._tx_log, self._format_exp(tainted_fee), sender,
+                               self._format_exp(tainted_fee_to_miner), miner)
             self._record_tainted_transaction(sender, miner, fee=True)
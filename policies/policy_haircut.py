@@ -1,3 +1,5 @@
+import logging
+
 from policies.blacklist import DictBlacklist
 from policies.blacklist_policy import BlacklistPolicy
 
@@ -8,6 +10,8 @@ class HaircutPolicy(BlacklistPolicy):
     Taints every transaction from a tainted account proportionally to the degree their account is tainted.
     """
 
+    __slots__ = ()
+
     def init_blacklist(self):
         return DictBlacklist()
 
@@ -15,20 +19,24 @@ class HaircutPolicy(BlacklistPolicy):
         return "Haircut"
 
     def _transfer_taint(self, from_address, to_address, amount_sent, currency, currency_2=None) -> int:
-        if not self.is_blacklisted(from_address, currency):
+        # a transfer without value cannot carry any taint, skip it before the sender's balance is requested
+        if amount_sent == 0:
             return 0
 
         if currency_2 is None:
             currency_2 = currency
 
-        if self.is_permanently_tainted(from_address):
+        if from_address in self.permanent_taint_list:
             taint_proportion = 1
             transferred_amount = amount_sent
         else:
-            blacklist_value = self.get_blacklist_value(from_address, currency)
-            sender_balance = self._get_temp_balance(from_address, currency)
+            blacklist_value = self.try_get_blacklist_value(from_address, currency)
+            if blacklist_value is None:
+                return 0
 
-            taint_proportion = blacklist_value / sender_balance
+            sender_balance = self._get_temp_balance(from_address, currency)
+            # only computed for the debug message, see below
+            taint_proportion = None
 
             # use multiplication first and then integer division to minimize rounding error
             transferred_amount = (amount_sent * blacklist_value) // sender_balance
@@ -38,39 +46,42 @@ class HaircutPolicy(BlacklistPolicy):
 
             self.remove_from_blacklist(from_address, transferred_amount, currency)
 
-        if to_address is None or to_address == self._eth_utils.null_address:
-            self._logger.info(self._tx_log + f"{amount_sent} tokens were burned, of which {transferred_amount} were blacklisted.")
+        if to_address is None or to_address == self._null_address:
+            self._logger.info("%s%s tokens were burned, of which %s were blacklisted.", self._tx_log, amount_sent, transferred_amount)
             return transferred_amount
 
         self.add_to_blacklist(to_address, transferred_amount, currency_2)
 
-        if currency == currency_2:
-            self._logger.debug(
-                self._tx_log + f"Transferred {format(transferred_amount, '.2e')} taint of {currency} from {from_address} to {to_address}. Taint proportion was {taint_proportion * 100}%")
+        if currency == currency_2 and self._logger.isEnabledFor(logging.DEBUG):
+            if taint_proportion is None:
+                taint_proportion = blacklist_value / sender_balance
+            self._logger.debug("%sTransferred %.2e taint of %s from %s to %s. Taint proportion was %s%%", self._tx_log, transferred_amount, currency, from_address, to_address,
+                               taint_proportion * 100)
 
         return transferred_amount
 
-    def _process_gas_fees(self, transaction_log, transaction, full_block, sender):
-        if not self.is_blacklisted(sender, "ETH"):
+    def _process_gas_fees(self, transaction_log, transaction, block_context, sender):
+        if not self._has_tainted_eth(sender):
             return
 
+        permanently_tainted = sender in self.permanent_taint_list
+        blacklist_value = None if permanently_tainted else self.try_get_blacklist_value(sender, "ETH")
+
         gas_price = transaction["gasPrice"]
-        base_fee = full_block["baseFeePerGas"]
+        base_fee = block_context.base_fee
         gas_used = transaction_log["gasUsed"]
-        miner = full_block["miner"]
+        miner = block_context.miner
 
         total_fee_paid = gas_price * gas_used
         paid_to_miner = (gas_price - base_fee) * gas_used
 
-        if self.is_permanently_tainted(sender):
+        if permanently_tainted:
             tainted_fee = total_fee_paid
             tainted_fee_to_miner = paid_to_miner
             taint_proportion = 1
         else:
-            blacklist_value = self.get_blacklist_value(sender, "ETH")
             sender_balance = self._get_temp_balance(sender, "ETH")
-
-            taint_proportion = blacklist_value / sender_balance
+            taint_proportion = None
 
             tainted_fee = (total_fee_paid * blacklist_value) // sender_balance
             tainted_fee_to_miner = (paid_to_miner * blacklist_value) // sender_balance
@@ -87,5 +98,8 @@ class HaircutPolicy(BlacklistPolicy):
 
         self._record_tainted_transaction(sender, miner, fee=True)
 
-        self._logger.debug(self._tx_log + f"Fee: Removed {format(tainted_fee, '.2e')} wei taint from {sender}, transferred {format(tainted_fee_to_miner, '.2e')} " +
-                           f"to miner {miner} and burned {format(tainted_fee - tainted_fee_to_miner, '.2e')}, taint proportion was {taint_proportion * 100}%")
+        if self._logger.isEnabledFor(logging.DEBUG):
+            if taint_proportion is None:
+                taint_proportion = blacklist_value / sender_balance
+            self._logger.debug("%sFee: Removed %.2e wei taint from %s, transferred %.2e to miner %s and burned %.2e, taint proportion was %s%%", self._tx_log, tainted_fee, sender,
+                               tainted_fee_to_miner, miner, tainted_fee - tainted_fee_to_miner, taint_proportion * 100)
@@ -8,6 +8,8 @@ class PoisonPolicy(BlacklistPolicy):
     Keeps a list of fully tainted accounts and taints every account that receives a transaction from a tainted account.
     """
 
+    __slots__ = ()
+
     def init_blacklist(self):
         return SetBlacklist()
 
@@ -15,35 +17,52 @@ class PoisonPolicy(BlacklistPolicy):
         return "Poison"
 
     def _transfer_taint(self, from_address, to_address, amount_sent, currency, currency_2=None) -> int:
-        if not self.is_blacklisted(from_address, currency) or self.is_blacklisted(to_address, currency):
+        # equivalent to is_blacklisted, since poison taints accounts regardless of the currency, but only requires set lookups
+        accounts = self._blacklist.get_accounts()
+        permanent_taint_list = self.permanent_taint_list
+        if from_address not in accounts and from_address not in permanent_taint_list:
+            return 0
+        if to_address in accounts or to_address in permanent_taint_list:
             return 0
 
         self.add_to_poison_blacklist(to_address, from_address)
         return 1
 
-    def _process_gas_fees(self, transaction_log, transaction, full_block, sender):
-        miner = full_block["miner"]
+    def _process_gas_fees(self, transaction_log, transaction, block_context, sender):
+        miner = block_context.miner
 
-        if not self.is_blacklisted(sender, "ETH") or self.is_blacklisted(miner):
+        accounts = self._blacklist.get_accounts()
+        permanent_taint_list = self.permanent_taint_list
+        if sender not in accounts and sender not in permanent_taint_list:
+            return
+        if miner in accounts or miner in permanent_taint_list:
             return
 
         self.add_to_poison_blacklist(miner, sender)
 
         self._record_tainted_transaction(sender, miner, fee=True)
 
+    def _has_eth_taint(self) -> bool:
+        # the set of accounts with blacklisted ETH is not maintained for the poison blacklist, see _process_gas_fees
+        return True
+
     def get_blacklisted_amount(self) -> dict:
         blacklist = self._blacklist.get_blacklist()
-        amounts = {"ETH": 0, self._eth_utils.WETH: 0}
+        amounts = {"ETH": 0, self._weth: 0}
+
+        # retrieve all balances with batched requests instead of two requests per account, skipping those retrieved before
+        block = self._current_block + 1
+        self._prefetch_balances([(account, currency) for account in blacklist for currency in amounts if (account, currency, block) not in self._balance_cache], block)
 
         for account in blacklist:
-            amounts["ETH"] += self._get_balance(account, "ETH", self._current_block + 1)
-            amounts[self._eth_utils.WETH] += self._get_balance(account, self._eth_utils.WETH, self._current_block + 1)
+            amounts["ETH"] += self._get_balance(account, "ETH", block)
+            amounts[self._weth] += self._get_balance(account, self._weth, block)
 
         return amounts
 
     def add_to_poison_blacklist(self, account, tainted_by):
         self.add_to_blacklist(account, 0, "")
-        self._logger.debug(f"Account {account} was tainted by a transaction from {tainted_by}")
+        self._logger.debug("Account %s was tainted by a transaction from %s", account, tainted_by)
 
     def _increase_temp_balance(self, account, currency, amount):
         # overwrite unnecessary function
@@ -53,16 +72,24 @@ class PoisonPolicy(BlacklistPolicy):
         # overwrite unnecessary function
         pass
 
+    def _transfer_temp_balance(self, sender, receiver, currency, amount):
+        # overwrite unnecessary function
+        pass
+
     def _add_to_temp_balances(self, account, currency, get_balance=False):
         # overwrite unnecessary function
         pass
 
+    def _prefetch_temp_balances(self, events, internal_transactions):
+        # overwrite unnecessary function
+        pass
+
     def fully_taint_token(self, account, currency, overwrite=False, block=None):
         # overwrite unnecessary function
         pass
 
     def sanity_check(self):
-        if self.is_blacklisted(self._eth_utils.null_address):
+        if self.is_blacklisted(self._null_address):
             self._logger.warning("Null address is blacklisted.")
 
     def _get_temp_balance(self, account, currency) -> int:
@@ -10,6 +10,8 @@ class SeniorityPolicy(BlacklistPolicy):
     Does not use temp balances, and therefore overrides them to do nothing.
     """
 
+    __slots__ = ()
+
     def init_blacklist(self):
         return DictBlacklist()
 
@@ -17,16 +19,21 @@ class SeniorityPolicy(BlacklistPolicy):
         return "Seniority"
 
     def _transfer_taint(self, from_address, to_address, amount_sent, currency, currency_2=None) -> int:
-        if not self.is_blacklisted(from_address, currency):
+        # a transfer without value cannot carry any taint
+        if amount_sent == 0:
             return 0
 
         if currency_2 is None:
             currency_2 = currency
 
-        if self.is_permanently_tainted(from_address):
+        if from_address in self.permanent_taint_list:
             transferred_amount = amount_sent
         else:
-            transferred_amount = min(amount_sent, self.get_blacklist_value(from_address, currency))
+            blacklist_value = self.try_get_blacklist_value(from_address, currency)
+            if blacklist_value is None:
+                return 0
+
+            transferred_amount = min(amount_sent, blacklist_value)
 
             if transferred_amount == 0:
                 return 0
@@ -35,35 +42,38 @@ class SeniorityPolicy(BlacklistPolicy):
 
         if to_address is None:
             return 0
-        elif to_address == self._eth_utils.null_address:
-            self._logger.debug(self._tx_log + f"{amount_sent} tokens were burned, of which {transferred_amount} were blacklisted.")
+        elif to_address == self._null_address:
+            self._logger.debug("%s%s tokens were burned, of which %s were blacklisted.", self._tx_log, amount_sent, transferred_amount)
             return 0
 
         self.add_to_blacklist(to_address, transferred_amount, currency_2)
 
         if currency == currency_2:
-            self._logger.debug(self._tx_log + f"Transferred {format(transferred_amount, '.2e')} taint of {currency} from {from_address} to {to_address}")
+            self._logger.debug("%sTransferred %.2e taint of %s from %s to %s", self._tx_log, transferred_amount, currency, from_address, to_address)
 
         return transferred_amount
 
-    def _process_gas_fees(self, transaction_log, transaction, full_block, sender):
-        if not self.is_blacklisted(sender, "ETH"):
+    def _process_gas_fees(self, transaction_log, transaction, block_context, sender):
+        if not self._has_tainted_eth(sender):
             return
 
+        permanently_tainted = sender in self.permanent_taint_list
+        blacklist_value = None if permanently_tainted else self.try_get_blacklist_value(sender, "ETH")
+
         gas_price = transaction["gasPrice"]
-        base_fee = full_block["baseFeePerGas"]
+        base_fee = block_context.base_fee
         gas_used = transaction_log["gasUsed"]
-        miner = full_block["miner"]
+        miner = block_context.miner
 
         total_fee_paid = gas_price * gas_used
         paid_to_miner = (gas_price - base_fee) * gas_used
 
-        if self.is_permanently_tainted(sender):
+        if permanently_tainted:
             tainted_fee = total_fee_paid
             tainted_fee_to_miner = paid_to_miner
         else:
-            tainted_fee = min(total_fee_paid, self.get_blacklist_value(sender, "ETH"))
-            tainted_fee_to_miner = min(paid_to_miner, self.get_blacklist_value(sender, "ETH"))
+            tainted_fee = min(total_fee_paid, blacklist_value)
+            tainted_fee_to_miner = min(paid_to_miner, blacklist_value)
 
             self.remove_from_blacklist(sender, tainted_fee, "ETH")
 
@@ -74,7 +84,7 @@ class SeniorityPolicy(BlacklistPolicy):
 
         self._record_tainted_transaction(sender, miner, fee=True)
 
-        self._logger.debug(self._tx_log + f"Fee: Removed {format(tainted_fee, '.2e')} wei taint from {sender}, and transferred {format(tainted_fee_to_miner, '.2e')} wei of which to miner {miner}")
+        self._logger.debug("%sFee: Removed %.2e wei taint from %s, and transferred %.2e wei of which to miner %s", self._tx_log, tainted_fee, sender, tainted_fee_to_miner, miner)
 
     def _increase_temp_balance(self, account, currency, amount):
         # overwrite unnecessary function
@@ -84,10 +94,18 @@ class SeniorityPolicy(BlacklistPolicy):
         # overwrite unnecessary function
         pass
 
+    def _transfer_temp_balance(self, sender, receiver, currency, amount):
+        # overwrite unnecessary function
+        pass
+
     def _add_to_temp_balances(self, account, currency, get_balance=False):
         # overwrite unnecessary function
         pass
 
+    def _prefetch_temp_balances(self, events, internal_transactions):
+        # overwrite unnecessary function
+        pass
+
     def _get_temp_balance(self, account, currency) -> int:
         # overwrite unnecessary function
         pass
@@ -92,11 +92,42 @@ function_abis = {
         "outputs": [{
             "name": "",
             "type": "uint256"}]
+    }],
+    "Aggregate3": [{
+        "inputs": [{
+            "components": [{"internalType": "address", "name": "target", "type": "address"},
+                           {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                           {"internalType": "bytes", "name": "callData", "type": "bytes"}],
+            "internalType": "struct Multicall3.Call3[]",
+            "name": "calls",
+            "type": "tuple[]"}],
+        "name": "aggregate3",
+        "outputs": [{
+            "components": [{"internalType": "bool", "name": "success", "type": "bool"},
+                           {"internalType": "bytes", "name": "returnData", "type": "bytes"}],
+            "internalType": "struct Multicall3.Result[]",
+            "name": "returnData",
+            "type": "tuple[]"}],
+        "stateMutability": "payable",
+        "type": "function"
     }]
 }
 
+# 4-byte selectors of functions called without a contract object (through Multicall3 or batched eth_call)
+selectors = {
+    "token0": "0x0dfe1681",
+    "token1": "0xd21220a7",
+    "balanceOf": "0x70a08231",
+    "getEthBalance": "0x4d2301cc",
+    "name": "0x06fdde03",
+    "symbol": "0x95d89b41"
+}
+
 topics = {
     "Deposit": "0xe1fffcc4923d04b559f4d29a8bfc6cda04eb5b0d3c460751c2402c5c5cc9109c",
     "Transfer": "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef",
     "Withdrawal": "0x7fcf532c15f0a6db0bd6d0e038bea71d30d808c7d98cb3bf7268a95bf5081b65"
 }
+
+# event types by their topic, for decoding logs with a single lookup
+events_by_topic = {topic: event_type for event_type, topic in topics.items()}
@@ -0,0 +1,79 @@
+import queue
+import threading
+
+from utilities.ethereum_utils import EthereumUtils
+
+
+class BlockPrefetcher:
+    """
+    Retrieves the data of a range of blocks in a background thread, ahead of their processing.
+    Iterating over the prefetcher yields (block number, block data) in order, see EthereumUtils.get_block_data.
+    """
+
+    def __init__(self, eth_utils: EthereumUtils, start_block: int, end_block: int, depth: int = 8, blocks_per_request: int = 4):
+        """
+        Starts retrieving the blocks in the background
+
+        :param eth_utils: EthereumUtils instance used to retrieve the blocks
+        :param start_block: first block
+        :param end_block: block after the last block
+        :param depth: maximum amount of blocks retrieved ahead of the processing
+        :param blocks_per_request: amount of consecutive blocks retrieved with a single batched request
+        """
+        self._eth_utils = eth_utils
+        self._start_block = start_block
+        self._end_block = end_block
+        self._blocks_per_request = max(blocks_per_request, 1)
+        self._queue = queue.Queue(maxsize=max(depth, 1))
+        self._stop_event = threading.Event()
+
+        self._thread = threading.Thread(target=self._run, name="BlockPrefetcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for first_block in range(self._start_block, self._end_block, self._blocks_per_request):
+            blocks = list(range(first_block, min(first_block + self._blocks_per_request, self._end_block)))
+            try:
+                items = [(block, block_data, None) for block, block_data in zip(blocks, self._eth_utils.get_blocks_data(blocks))]
+            except Exception as e:
+                # hand the exception to the consumer, which raises it once it reaches these blocks
+                items = [(first_block, None, e)]
+
+            for item in items:
+                if not self._put(item) or item[2] is not None:
+                    return
+
+    def _put(self, item) -> bool:
+        """
+        Waits until the item can be queued, unless the prefetcher is closed in the meantime
+
+        :param item: (block number, block data, exception)
+        :return: true if the item was queued
+        """
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self):
+        for _ in range(self._start_block, self._end_block):
+            block, block_data, exception = self._queue.get()
+            if exception is not None:
+                raise exception
+            yield block, block_data
+
+    def close(self):
+        """
+        Stops retrieving blocks
+        """
+        self._stop_event.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,50 @@
+"""
+Provides the parameters from config.ini
+"""
+
+import configparser
+import functools
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """
+    Parameters read from the PARAMETERS section of the config file
+    """
+    data_folder: str  # data folder for the evaluation results
+    node_data_dir: str  # blockchain data directory used by the node
+    core_map: dict  # CPU core each policy is pinned to, by policy name as used for --policy
+    ipc_path: str  # IPC endpoint of the local node, empty if not available
+
+
+def _parse_core_map(value: str) -> dict:
+    """
+    Parses the CoreMap parameter, e.g. "fifo:0, seniority:1"
+
+    :param value: comma-separated list of policy name and CPU core pairs
+    :return: dict of policy name -> CPU core
+    """
+    core_map = {}
+    for entry in value.split(","):
+        if entry.strip():
+            policy_name, core = entry.split(":")
+            core_map[policy_name.strip().lower()] = int(core)
+
+    return core_map
+
+
+@functools.lru_cache(maxsize=None)
+def load_config(path: str = "config.ini") -> Config:
+    """
+    Reads the config file, which is only parsed once per path
+
+    :param path: path of the config file
+    :return: parsed parameters
+    """
+    config = configparser.ConfigParser()
+    config.read(path)
+    parameters = config["PARAMETERS"]
+
+    return Config(data_folder=parameters["DataFolder"], node_data_dir=parameters["NodeDataDir"], core_map=_parse_core_map(parameters.get("CoreMap", "")),
+                  ipc_path=parameters.get("IpcPath", ""))
@@ -1,13 +1,16 @@
 import functools
 from typing import List, Optional, Tuple
 
+import requests
 import web3.exceptions
+from hexbytes import HexBytes
 from web3 import Web3
+from web3._utils.events import get_event_data
+from web3._utils.method_formatters import block_formatter
 from web3.datastructures import AttributeDict
-from web3.logs import DISCARD
+from web3.exceptions import InvalidEventABI, LogTopicError, MismatchedABI
 
-import utilities.abis
-import utilities.utils
+from utilities import abis, utils
 from utilities.abis import event_abis
 
 
@@ -18,12 +21,18 @@ class EthereumUtils:
 
     def __init__(self, w3: Web3, logger):
         self.w3 = w3
-        self.eth_list = ["0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2"]
+        # lowercase, see is_eth
+        self.eth_list = frozenset({"0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2"})
         self.null_address = "0x0000000000000000000000000000000000000000"
         self.WETH = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
+        self.multicall3 = "0xcA11bde05977b3631167028862bE2a173976CA11"
+        # Multicall3 cannot be called at earlier blocks
+        self.multicall3_deployment_block = 14353601
         self.logger = logger
         self.current_tx = ""
         self.reverted_traces = []
+        # token names and symbols never change, so they are cached for the entire run
+        self._names_symbols = {}
 
     def _get_token_balance(self, account: str, token_address: str, block: int = None):
         """
@@ -38,21 +47,24 @@ class EthereumUtils:
         if block is None:
             block = self.w3.eth.get_block_number()
 
-        contract = self.get_smart_contract(token_address, function_types=("BalanceOf",))
+        # the call data is built directly, like in prefetch_balances, instead of going through a contract object and the ABI codec
+        call_data = abis.selectors["balanceOf"] + account[2:].lower().rjust(64, "0")
 
         try:
-            balance = contract.functions.balanceOf(account).call({}, block)
-        except web3.exceptions.BadFunctionCallOutput:
-            balance = -1
+            return_data = self.w3.eth.call({"to": utils.to_checksum_address(token_address), "data": call_data}, block)
         except web3.exceptions.ContractLogicError:
-            balance = -2
+            return -2
+
+        # no uint256 returned, e.g. if there is no contract at the address
+        if len(return_data) < 32:
+            return -1
 
-        return balance
+        return int.from_bytes(return_data[:32], "big")
 
     def is_weth(self, address):
         if address is None:
             return False
-        return Web3.toChecksumAddress(address) == self.WETH
+        return utils.to_checksum_address(address) == self.WETH
 
     @functools.lru_cache(maxsize=1024)
     def get_balance(self, account, currency, block):
@@ -62,14 +74,134 @@ class EthereumUtils:
             return self._get_token_balance(account=account, token_address=currency, block=block)
 
     def is_eth(self, currency: str):
-        if currency == "ETH":
-            return True
-        else:
-            return currency in self.eth_list
+        return currency == "ETH" or currency.lower() in self.eth_list
 
     def get_block_receipts(self, block):
         return [utils.format_log_dict(log) for log in self.w3.manager.request_blocking("eth_getBlockReceipts", [block])]
 
+    def batch_request(self, calls: List[Tuple[str, list]]) -> list:
+        """
+        Sends the given JSON-RPC calls in a single batch if the provider supports it, else one by one
+
+        :param calls: list of (method, params)
+        :return: list of raw responses (with either "result" or "error"), in the order of the calls
+        """
+        provider = self.w3.provider
+        if hasattr(provider, "make_batch_request"):
+            return provider.make_batch_request(calls)
+        return [provider.make_request(method, params) for method, params in calls]
+
+    def prefetch_balances(self, balances: List[Tuple[str, str]], block: int, batch_size: int = 100) -> dict:
+        """
+        Retrieves the given balances with one Multicall3 call or batched request per batch.
+        Balances that cannot be retrieved this way are missing from the result and left to get_balance.
+        Nothing is stored, the caller caches the result for as long as the block is relevant.
+
+        :param balances: list of (account, currency), currency is ETH or a token address
+        :param block: block number
+        :param batch_size: maximum amount of balances retrieved per request (the node rejects larger JSON-RPC batches, Erigon's default limit is 100)
+        :return: dict of (account, currency, block) -> balance, -1 for tokens without a balanceOf return value
+        """
+        if len(balances) > batch_size:
+            prefetched_balances = {}
+            for index in range(0, len(balances), batch_size):
+                prefetched_balances.update(self.prefetch_balances(balances[index:index + batch_size], block, batch_size))
+            return prefetched_balances
+
+        prefetched_balances = {}
+
+        # a single eth_call through Multicall3 is executed by the node in one EVM context, instead of one per balance
+        if block >= self.multicall3_deployment_block:
+            multicalls = []
+            for account, currency in balances:
+                padded_account = account[2:].lower().rjust(64, "0")
+                if currency == "ETH":
+                    multicalls.append((self.multicall3, abis.selectors["getEthBalance"] + padded_account))
+                else:
+                    multicalls.append((currency, abis.selectors["balanceOf"] + padded_account))
+
+            try:
+                results = self.multicall(multicalls, block)
+            except (ValueError, web3.exceptions.ContractLogicError, web3.exceptions.BadFunctionCallOutput):
+                self.logger.debug("Multicall for balances failed, retrieving them with a batched request.")
+            else:
+                for (account, currency), (success, return_data) in zip(balances, results):
+                    if not success:
+                        continue
+                    # tokens without a balanceOf return value are marked the same way as in _get_token_balance
+                    if len(return_data) < 32:
+                        prefetched_balances[(account, currency, block)] = -1
+                    else:
+                        prefetched_balances[(account, currency, block)] = int.from_bytes(return_data[:32], "big")
+                return prefetched_balances
+
+        calls = []
+        for account, currency in balances:
+            if currency == "ETH":
+                calls.append(("eth_getBalance", [account, hex(block)]))
+            else:
+                call_data = abis.selectors["balanceOf"] + account[2:].lower().rjust(64, "0")
+                calls.append(("eth_call", [{"to": currency, "data": call_data}, hex(block)]))
+
+        # the prefetch is optional, if the batch is rejected as a whole get_balance retrieves the balances one by one
+        try:
+            responses = self.batch_request(calls)
+        except (ValueError, requests.exceptions.RequestException) as e:
+            self.logger.debug("Batched request for balances failed (%s), retrieving them one by one.", e)
+            return prefetched_balances
+
+        for (account, currency), response in zip(balances, responses):
+            if "error" in response or response["result"] is None:
+                continue
+            result = response["result"]
+            if currency == "ETH":
+                prefetched_balances[(account, currency, block)] = utils.hex_to_int(result)
+            # tokens without a balanceOf return value are marked the same way as in _get_token_balance
+            elif len(result) < 66:
+                prefetched_balances[(account, currency, block)] = -1
+            else:
+                prefetched_balances[(account, currency, block)] = int(result[2:66], 16)
+
+        return prefetched_balances
+
+    def get_block_data(self, block: int):
+        """
+        Retrieves the full block, its receipts and its traces with a single batched request
+
+        :param block: block number
+        :return: full block (incl. transactions), list of formatted receipts, list of traces
+        """
+        return self.get_blocks_data([block])[0]
+
+    def get_blocks_data(self, blocks: List[int]) -> list:
+        """
+        Retrieves the full blocks, their receipts and their traces for multiple blocks with a single batched request
+
+        :param blocks: block numbers
+        :return: list of (full block (incl. transactions), list of formatted receipts, list of traces), in the order of the blocks
+        """
+        calls = []
+        for block in blocks:
+            calls.extend([("eth_getBlockByNumber", [hex(block), True]), ("eth_getBlockReceipts", [hex(block)]), ("trace_block", [hex(block)])])
+        responses = self.batch_request(calls)
+
+        for response in responses:
+            if "error" in response:
+                raise ValueError(response["error"])
+
+        blocks_data = []
+        for index, block in enumerate(blocks):
+            block_result, receipts_result, traces_result = (response["result"] for response in responses[3 * index:3 * index + 3])
+
+            if block_result is None:
+                raise web3.exceptions.BlockNotFound(f"Block with id: '{block}' not found.")
+
+            full_block = AttributeDict.recursive(block_formatter(block_result))
+            receipts = [utils.format_log_dict(receipt) for receipt in receipts_result]
+            blocks_data.append((full_block, receipts, traces_result))
+
+        return blocks_data
+
     def internal_transaction_to_event(self, internal_tx) -> Optional[dict]:
         """
         Converts a transaction trace into an event that can be processed by check_transaction.
@@ -95,39 +227,45 @@ class EthereumUtils:
                 #                   f"since it follows a reverted int. transaction with trace {reverted_trace}.")
                 return None
 
-        if "value" not in internal_tx["action"] or "from" not in internal_tx["action"]:
+        action = internal_tx["action"]
+
+        if "value" not in action or "from" not in action:
             # process contract suicide
             if "type" in internal_tx and internal_tx["type"] == "suicide":
-                value = int(internal_tx["action"]["balance"], base=16)
+                value = utils.hex_to_int(action["balance"])
                 if value == 0:
                     return None
                 event_type = "Suicide"
-                receiver = internal_tx["action"]["refundAddress"]
-                sender = internal_tx["action"]["address"]
-                return {"args": {"from": Web3.toChecksumAddress(sender), "to": Web3.toChecksumAddress(receiver),
+                receiver = action["refundAddress"]
+                sender = action["address"]
+                return {"args": {"from": utils.to_checksum_address(sender), "to": utils.to_checksum_address(receiver),
                                  "value": value}, "address": "ETH", "event": event_type}
             else:
                 return None
 
-        if "to" not in internal_tx["action"]:
+        if "to" not in action:
             # process contract creation
             if "type" in internal_tx and internal_tx["type"] == "create":
-                value = int(internal_tx["action"]["value"], base=16)
+                value = utils.hex_to_int(action["value"])
                 if value == 0:
                     return None
                 event_type = "Creation"
                 receiver = internal_tx["result"]["address"]
-                sender = internal_tx["action"]["from"]
-                return {"args": {"from": Web3.toChecksumAddress(sender), "to": Web3.toChecksumAddress(receiver),
+                sender = action["from"]
+                return {"args": {"from": utils.to_checksum_address(sender), "to": utils.to_checksum_address(receiver),
                                  "value": value}, "address": "ETH", "event": event_type}
             else:
                 return None
 
-        value = int(internal_tx["action"]["value"], base=16)
-        if value > 0 and "callType" in internal_tx["action"] and internal_tx["action"]["callType"] == "call":
+        # most traces carry no value, so check the call type and the raw hex string before parsing it
+        if action.get("callType") != "call" or action["value"] == "0x0":
+            return None
+
+        value = utils.hex_to_int(action["value"])
+        if value > 0:
 
-            sender = internal_tx["action"]["from"]
-            receiver = internal_tx["action"]["to"]
+            sender = action["from"]
+            receiver = action["to"]
 
             # detect Deposit and Withdrawal by the involvement of the WETH token address
             event_type = "Internal Transaction"
@@ -135,26 +273,53 @@ class EthereumUtils:
                 event_type = "Withdrawal"
             if self.is_weth(receiver):
                 event_type = "Deposit"
-            return {"args": {"from": Web3.toChecksumAddress(sender), "to": Web3.toChecksumAddress(receiver),
+            return {"args": {"from": utils.to_checksum_address(sender), "to": utils.to_checksum_address(receiver),
                              "value": value}, "address": "ETH", "event": event_type}
         return None
 
+    @staticmethod
+    @functools.lru_cache(64)
+    def _build_abi(event_types: tuple = None, function_types: tuple = None) -> list:
+        """
+        Assembles the ABI for the given event and function types.
+        Cached, since only a handful of type combinations are ever requested.
+
+        :param event_types: names of entries in abis.event_abis
+        :param function_types: names of entries in abis.function_abis
+        :return: ABI as list
+        """
+        abi = []
+        if event_types:
+            for event_type in event_types:
+                if event_type not in abis.event_abis:
+                    raise ValueError(f"Tried to get smart contract with an event type that does not exist ('{event_type}')")
+                abi.extend(abis.event_abis[event_type])
+        if function_types:
+            for function_type in function_types:
+                if function_type not in abis.function_abis:
+                    raise ValueError(f"Tried to get smart contract with a function type that does not exist ('{function_type}')")
+                abi.extend(abis.function_abis[function_type])
+
+        return abi
+
+    @functools.lru_cache(64)
+    def _get_contract_factory(self, event_types: tuple = None, function_types: tuple = None):
+        """
+        Creates a contract factory for the given event and function types, which is only done once per type combination,
+        so the ABI is not parsed again for every contract address
+
+        :param event_types: names of entries in abis.event_abis
+        :param function_types: names of entries in abis.function_abis
+        :return: contract factory without address
+        """
+        return self.w3.eth.contract(abi=self._build_abi(event_types, function_types))
+
     @functools.lru_cache(4096)
     def get_smart_contract(self, address, abi: dict = None, event_types: tuple = None, function_types: tuple = None):
         if abi is None:
-            abi = []
-            if event_types:
-                for event_type in event_types:
-                    if event_type not in abis.event_abis:
-                        raise ValueError(f"Tried to get smart contract with an event type that does not exist ('{event_type}')")
-                    abi.append(abis.event_abis[event_type][0])
-            if function_types:
-                for function_type in function_types:
-                    if function_type not in abis.function_abis:
-                        raise ValueError(f"Tried to get smart contract with a function type that does not exist ('{function_type}')")
-                    abi.append(abis.function_abis[function_type][0])
-
-        return self.w3.eth.contract(address=Web3.toChecksumAddress(address), abi=abi)
+            return self._get_contract_factory(event_types, function_types)(address=utils.to_checksum_address(address))
+
+        return self.w3.eth.contract(address=utils.to_checksum_address(address), abi=abi)
 
     @staticmethod
     def format_exponential(input_number: int, decimals: int):
@@ -172,54 +337,44 @@ class EthereumUtils:
         :return: list of decoded logs
         """
         log_dict = {}
-        checked_addresses = []
-        topics = []
 
         for event_type in event_types:
             if event_type not in event_abis or event_type not in abis.topics:
                 raise ValueError(f"Tried to get all events of an event type that does not exist ('{event_type}')")
-            topics.append(abis.topics[event_type])
 
-        logs = [log for log in receipt["logs"] if log["topics"] and log["topics"][0].hex() in topics]
+        for log in receipt["logs"]:
+            if not log["topics"]:
+                continue
 
-        for log in logs:
-            token = Web3.toChecksumAddress(log["address"])
+            # the topic is converted once per log and mapped to its event type with a single lookup
+            event_type = abis.events_by_topic.get(log["topics"][0].hex())
+            if event_type is None or event_type not in event_types:
+                continue
+
+            token = utils.to_checksum_address(log["address"])
 
             try:
-                if log["data"] == "0x":
-                    value = 0
-                else:
-                    value = int(log["data"], base=16)
-                address_1 = Web3.toChecksumAddress("0x" + log["topics"][1].hex()[-40:])
+                value = utils.hex_to_int(log["data"])
+                address_1 = utils.topic_to_address(log["topics"][1])
 
-                if log["topics"][0].hex() == abis.topics["Transfer"]:
-                    to_address = Web3.toChecksumAddress("0x" + log["topics"][2].hex()[-40:])
+                if event_type == "Transfer":
+                    to_address = utils.topic_to_address(log["topics"][2])
                     log_dict[log["logIndex"]] = {"address": token, "args": {"from": address_1, "to": to_address, "value": value}, "event": "Transfer"}
-                elif log["topics"][0].hex() == abis.topics["Withdrawal"]:
+                elif event_type == "Withdrawal":
                     log_dict[log["logIndex"]] = {"address": token, "args": {"src": address_1, "wad": value}, "event": "Withdrawal"}
-                elif log["topics"][0].hex() == abis.topics["Deposit"]:
+                elif event_type == "Deposit":
                     log_dict[log["logIndex"]] = {"address": token, "args": {"dst": address_1, "wad": value}, "event": "Deposit"}
 
             except IndexError:
-                smart_contract = log["address"]
-                if smart_contract in checked_addresses:
+                # non-standard log layout (e.g. no indexed parameters), decode it using the event ABI instead
+                try:
+                    decoded_log = get_event_data(self.w3.codec, event_abis[event_type][0], log)
+                except (MismatchedABI, LogTopicError, InvalidEventABI, TypeError):
                     continue
-                checked_addresses.append(smart_contract)
-
-                contract_object = self.get_smart_contract(smart_contract, event_types=tuple(event_types))
-
-                if contract_object is None:
-                    continue
-
-                # Decode any matching logs
-                for event_type in event_types:
-                    decoded_logs = contract_object.events[event_type]().processReceipt(receipt, errors=DISCARD)
-                    for decoded_log in decoded_logs:
-                        log_dict[decoded_log["logIndex"]] = decoded_log
+                log_dict[decoded_log["logIndex"]] = decoded_log
 
         return [log_dict[key] for key in sorted(log_dict)]
 
-    @functools.lru_cache(64)
     def get_contract_name_symbol(self, address: str) -> Tuple[Optional[str], Optional[str]]:
         """
         Retrieves the token name and symbol from a token address
@@ -227,7 +382,19 @@ class EthereumUtils:
         :param address: Ethereum address
         :return: (name, symbol) as string if available, else None for each unavailable field
         """
-        contract = self.get_smart_contract(address=Web3.toChecksumAddress(address), function_types=("Name", "Symbol"))
+        if address not in self._names_symbols:
+            self._names_symbols[address] = self._retrieve_contract_name_symbol(address)
+
+        return self._names_symbols[address]
+
+    def _retrieve_contract_name_symbol(self, address: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Retrieves the token name and symbol from a token address, without using the cache
+
+        :param address: Ethereum address
+        :return: (name, symbol) as string if available, else None for each unavailable field
+        """
+        contract = self.get_smart_contract(address, function_types=("Name", "Symbol"))
 
         name = None
         symbol = None
@@ -236,12 +403,71 @@ class EthereumUtils:
             name = contract.functions.name().call()
             symbol = contract.functions.symbol().call()
         except web3.exceptions.BadFunctionCallOutput:
-            self.logger.debug(f"Name and/or Symbol for {address} could not be retrieved, since it is not a smart contract.")
+            self.logger.debug("Name and/or Symbol for %s could not be retrieved, since it is not a smart contract.", address)
         except web3.exceptions.ContractLogicError:
-            self.logger.debug(f"Name and/or Symbol function of smart contract at {address} could does not exist.")
+            self.logger.debug("Name and/or Symbol function of smart contract at %s could does not exist.", address)
 
         return name, symbol
 
+    def get_contract_names_symbols(self, addresses: List[str], batch_size: int = 250) -> dict:
+        """
+        Retrieves the token names and symbols of multiple token addresses through Multicall3, with one request per batch of uncached addresses
+
+        :param addresses: Ethereum addresses
+        :param batch_size: maximum amount of addresses per request
+        :return: dict of address -> (name, symbol) as string if available, else None for each unavailable field
+        """
+        uncached_addresses = [address for address in dict.fromkeys(addresses) if address not in self._names_symbols]
+
+        for index in range(0, len(uncached_addresses), batch_size):
+            batch = uncached_addresses[index:index + batch_size]
+            calls = [(address, abis.selectors[function_name]) for address in batch for function_name in ["name", "symbol"]]
+
+            try:
+                results = self.multicall(calls)
+            except (ValueError, web3.exceptions.ContractLogicError, web3.exceptions.BadFunctionCallOutput):
+                self.logger.debug("Multicall for names and symbols failed, retrieving them one by one.")
+                for address in batch:
+                    self.get_contract_name_symbol(address)
+                continue
+
+            for position, address in enumerate(batch):
+                name, symbol = (self._decode_string_result(success, return_data) for success, return_data in results[2 * position:2 * position + 2])
+                self._names_symbols[address] = (name, symbol)
+
+        return {address: self._names_symbols[address] for address in addresses}
+
+    def _decode_string_result(self, success: bool, return_data: bytes) -> Optional[str]:
+        """
+        Decodes the result of a call returning a string
+
+        :param success: whether the call succeeded
+        :param return_data: data returned by the call
+        :return: decoded string, None if the call failed or did not return a string
+        """
+        if not success:
+            return None
+        try:
+            return self.w3.codec.decode_abi(["string"], return_data)[0]
+        except Exception:
+            return None
+
+    def multicall(self, calls: List[Tuple[str, str]], block=None) -> list:
+        """
+        Executes the given calls in a single eth_call through the Multicall3 contract
+
+        :param calls: list of (target address, call data)
+        :param block: block to be executed at, defaults to the latest block
+        :return: list of (success, return data), in the order of the calls
+        """
+        if block is None:
+            block = "latest"
+
+        contract = self.get_smart_contract(self.multicall3, function_types=("Aggregate3",))
+        call_structs = [(utils.to_checksum_address(target), True, HexBytes(call_data)) for target, call_data in calls]
+
+        return contract.functions.aggregate3(call_structs).call({}, block)
+
     def get_swap_tokens(self, contract_address: str):
         """
         Gets the addresses of the token pair of a DEX smart contract
@@ -249,18 +475,27 @@ class EthereumUtils:
         :param contract_address: address of the smart contract
         :return: token0, token1 / None, None if an error occurs
         """
-        token_functions_abi = abis.function_abis["Tokens"]
-
-        contract = self.w3.eth.contract(address=Web3.toChecksumAddress(contract_address), abi=token_functions_abi)
-
-        token0 = None
-        token1 = None
         try:
-            token0 = contract.functions.token0().call({})
-            token1 = contract.functions.token1().call({})
+            results = self.multicall([(contract_address, abis.selectors["token0"]), (contract_address, abis.selectors["token1"])])
         except web3.exceptions.BadFunctionCallOutput:
-            self.logger.warning(f"token0 or token1 function for DEX contract at {contract_address} could not be executed.")
-        except web3.exceptions.ContractLogicError:
-            self.logger.warning(f"Smart contract at {contract_address} does not support token0 or token1 functions.")
+            self.logger.warning("token0 or token1 function for DEX contract at %s could not be executed.", contract_address)
+            return None, None
+        except (ValueError, web3.exceptions.ContractLogicError):
+            # also raised by the node if Multicall3 is not deployed at the queried block
+            self.logger.warning("Smart contract at %s does not support token0 or token1 functions.", contract_address)
+            return None, None
+
+        tokens = []
+        for function_name, (success, return_data) in zip(["token0", "token1"], results):
+            if not success:
+                self.logger.warning("Smart contract at %s does not support the %s function.", contract_address, function_name)
+                tokens.append(None)
+            elif len(return_data) < 32:
+                self.logger.warning("%s function for DEX contract at %s could not be executed.", function_name, contract_address)
+                tokens.append(None)
+            else:
+                # the address is right-aligned in the 32-byte return word
+                tokens.append(utils.to_checksum_address(return_data[12:32]))
 
+        token0, token1 = tokens
         return token0, token1
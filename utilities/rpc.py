@@ -0,0 +1,179 @@
+"""
+JSON-RPC providers used to reduce the number of round trips to the node
+"""
+
+import json
+import socket
+from typing import List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from web3 import HTTPProvider, IPCProvider
+from web3._utils.request import DEFAULT_TIMEOUT
+from web3._utils.threads import Timeout
+
+try:
+    import orjson
+except ImportError:
+    # optional, the standard library is used as fallback
+    orjson = None
+
+
+def json_dumps(data) -> bytes:
+    """
+    Encodes the given data as JSON, using orjson if available.
+    Only suitable for data without integers above 64 bits, which orjson does not support (JSON-RPC requests and responses only contain hex strings).
+
+    :param data: data to encode
+    :return: encoded data
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
+
+
+def json_loads(data):
+    """
+    Decodes the given JSON data, using orjson if available.
+    Only suitable for data without integers above 64 bits, which orjson would return as floats.
+
+    :param data: JSON as bytes or string
+    :return: decoded data
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _encode_batch(calls: List[Tuple[str, list]]) -> bytes:
+    """
+    Encodes the given calls as a JSON-RPC batch, using their index as id
+
+    :param calls: list of (method, params)
+    :return: encoded batch request
+    """
+    return json_dumps([{"jsonrpc": "2.0", "method": method, "params": params, "id": request_id} for request_id, (method, params) in enumerate(calls)])
+
+
+def _order_batch_responses(responses) -> list:
+    """
+    Orders the decoded responses to a batch request created by _encode_batch
+
+    :param responses: decoded batch response
+    :return: list of raw responses (with either "result" or "error"), in the order of the calls
+    """
+    # errors concerning the entire batch are returned as a single response object
+    if isinstance(responses, dict):
+        raise ValueError(responses["error"])
+
+    return sorted(responses, key=lambda response: response["id"])
+
+
+class BatchHTTPProvider(HTTPProvider):
+    """
+    HTTP provider that can additionally send several JSON-RPC requests in a single POST.
+    All requests, from any thread, go through one persistent session, so connections are kept alive and reused.
+    """
+
+    def __init__(self, endpoint_uri=None, request_kwargs=None, pool_size: int = 32, connect_retries: int = 3):
+        """
+        :param endpoint_uri: URI of the node
+        :param request_kwargs: additional arguments for the requests, see HTTPProvider
+        :param pool_size: maximum amount of connections kept alive
+        :param connect_retries: retries if a connection cannot be established (requests that reached the node are never repeated)
+        """
+        self._session = requests.Session()
+        retries = Retry(total=None, connect=connect_retries, read=0, status=0, other=0, backoff_factor=0.5, allowed_methods=None)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        super().__init__(endpoint_uri, request_kwargs, session=self._session)
+
+    def _post(self, request_data: bytes) -> bytes:
+        """
+        Posts the encoded request to the endpoint using the persistent session
+
+        :param request_data: encoded JSON-RPC request
+        :return: raw response content
+        """
+        request_kwargs = self.get_request_kwargs()
+        request_kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+
+        response = self._session.post(self.endpoint_uri, data=request_data, **request_kwargs)
+        response.raise_for_status()
+
+        return response.content
+
+    def decode_rpc_response(self, raw_response: bytes):
+        # responses contain hex strings only, so orjson can be used, which is considerably faster on large blocks and traces
+        return json_loads(raw_response)
+
+    def make_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        return self.decode_rpc_response(self._post(request_data))
+
+    def make_batch_request(self, calls: List[Tuple[str, list]]) -> list:
+        """
+        Sends all calls as a single JSON-RPC batch
+
+        :param calls: list of (method, params)
+        :return: list of raw responses (with either "result" or "error"), in the order of the calls
+        """
+        if not calls:
+            return []
+
+        return _order_batch_responses(json_loads(self._post(_encode_batch(calls))))
+
+
+class BatchIPCProvider(IPCProvider):
+    """
+    IPC provider that can additionally send several JSON-RPC requests at once.
+    Preferable to the HTTP provider if the node runs on the same machine, since it avoids the HTTP and TCP overhead.
+    """
+
+    def decode_rpc_response(self, raw_response: bytes):
+        # see BatchHTTPProvider.decode_rpc_response
+        return json_loads(raw_response)
+
+    def make_batch_request(self, calls: List[Tuple[str, list]]) -> list:
+        """
+        Sends all calls as a single JSON-RPC batch
+
+        :param calls: list of (method, params)
+        :return: list of raw responses (with either "result" or "error"), in the order of the calls
+        """
+        if not calls:
+            return []
+
+        request_data = _encode_batch(calls)
+
+        with self._lock, self._socket as sock:
+            try:
+                sock.sendall(request_data)
+            except BrokenPipeError:
+                # one extra attempt, then give up
+                sock = self._socket.reset()
+                sock.sendall(request_data)
+
+            # read until the received data can be decoded completely
+            raw_response = b""
+            with Timeout(self.timeout) as timeout:
+                while True:
+                    try:
+                        raw_response += sock.recv(65536)
+                    except socket.timeout:
+                        timeout.sleep(0)
+                        continue
+
+                    # a valid JSON-RPC response can only end in } or ]
+                    if raw_response.rstrip().endswith((b"]", b"}")):
+                        try:
+                            responses = json_loads(raw_response)
+                        except ValueError:
+                            # the response is not complete yet
+                            timeout.sleep(0)
+                            continue
+                        return _order_batch_responses(responses)
+                    timeout.sleep(0)
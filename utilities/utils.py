@@ -1,4 +1,9 @@
+import functools
+import sys
+from logging.handlers import QueueHandler
+
 from hexbytes import HexBytes
+from web3 import Web3
 from web3.datastructures import AttributeDict
 
 
@@ -39,3 +44,49 @@ def format_log_dict(log_dict: AttributeDict) -> AttributeDict:
         result_dict["logs"].append(result_log)
 
     return AttributeDict(result_dict)
+
+
+def hex_to_int(hex_string: str) -> int:
+    """
+    Converts a hex string as returned by the node to an integer
+
+    :param hex_string: hex string with 0x prefix, "0x" is treated as 0
+    :return: integer value
+    """
+    if hex_string == "0x":
+        return 0
+    return int(hex_string, base=16)
+
+
+def topic_to_address(topic: bytes) -> str:
+    """
+    Extracts the address from an indexed event topic, in which it is right-aligned
+
+    :param topic: 32-byte topic
+    :return: checksum address
+    """
+    return to_checksum_address(topic[-20:])
+
+
+@functools.lru_cache(maxsize=1_000_000)
+def to_checksum_address(address) -> str:
+    """
+    Converts the given address to its checksum format.
+    Cached, since the same accounts and tokens occur over and over, and every conversion requires a keccak hash.
+    The result is interned, since it is mostly used as a key of the blacklist dicts.
+
+    :param address: address as hex string or bytes
+    :return: checksum address
+    """
+    return sys.intern(Web3.toChecksumAddress(address))
+
+
+class UnformattedQueueHandler(QueueHandler):
+    """
+    Queue handler that enqueues log records as they are, so that their messages are only formatted by the handlers of the QueueListener on its background thread.
+    The default QueueHandler formats and copies every record on the logging thread.
+    Records are not copied, which is safe since the logged arguments are not modified after logging.
+    """
+
+    def prepare(self, record):
+        return record